@@ -0,0 +1,258 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import warnings
+
+import numpy as np
+import scipy
+import sklearn
+from scipy.sparse import hstack
+
+from dataset_store import read_spec
+from model_artifact import load_model
+from predict_final_test_on_combined_TFIDF_pandas import loadObjectFromFile, readLinesFromFile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+MODEL_DIR = os.path.join(ROOT_DIR, 'Model2')
+CODES_DIR = os.path.join(ROOT_DIR, 'Codes')
+DATASETS_DIR = os.path.join(ROOT_DIR, 'datasets')
+
+# Test file each language's bundles are measured on; synthetic inputs are sampled from it
+LANGUAGE_TEST_FILES = {
+    'hindi': 'test-data.txt',
+    'marathi': 'test-data-marathi.txt',
+    'telugu': 'test-data-telugu.txt',
+}
+
+# Results where a larger value is better; for every other metric smaller is better
+HIGHER_IS_BETTER = ('lines_per_sec',)
+# Smallest absolute change of each metric kind that can count as a regression, so timer and
+# allocator noise on small values (a sub-millisecond load, say) does not fail the comparison
+MIN_REGRESSION_DELTA = {'seconds': 0.01, 'rss_mb': 16.0}
+
+
+def shippedBundles():
+    """Every model bundle in the repo as (name, kind, language, files)"""
+    bundles = []
+    for language in LANGUAGE_TEST_FILES:
+        bundles.append((f'{language}-svm', 'pickle', language, [
+            os.path.join(MODEL_DIR, f'{language}-train-vect-word-svm.pkl'),
+            os.path.join(MODEL_DIR, f'{language}-train-vect-char-svm.pkl'),
+            os.path.join(MODEL_DIR, f'{language}-classifier-svm.pkl')]))
+        bundles.append((f'{language}-compiled', 'compiled', language, [
+            os.path.join(MODEL_DIR, f'{language}-compiled-svm.bin')]))
+    bundles.append(('codes-linear-svm-1800', 'pickle', 'hindi', [
+        os.path.join(CODES_DIR, 'train-vect-pandas-word-1-1-linear-svm-new-1800.pkl'),
+        os.path.join(CODES_DIR, 'train-vect-pandas-char-2-5-linear-svm-new-1800.pkl'),
+        os.path.join(CODES_DIR, 'linear-svm-new-1800-word-1-1-char-2-5-pandas.pkl')]))
+    return bundles
+
+
+def loadBundle(kind, files):
+    if kind == 'compiled':
+        return load_model(files[0])
+    return [loadObjectFromFile(f) for f in files]
+
+
+def testLines(language, store=None):
+    """Name and lines of the language's test file, or of its test split in a dataset store"""
+    if store:
+        spec = f'{store}:{language}:test'
+        return os.path.basename(spec), read_spec(spec).texts()
+    testFile = LANGUAGE_TEST_FILES[language]
+    return testFile, readLinesFromFile(os.path.join(DATASETS_DIR, testFile))
+
+
+def benchmarkInputs(language, scales, seed, store=None):
+    """The language's test lines plus synthetic inputs of each scale sampled from them with a fixed seed"""
+    testName, lines = testLines(language, store)
+    inputs = [(testName, lines)]
+    rng = random.Random(seed)
+    for scale in scales:
+        inputs.append((f'synthetic-{scale}', [rng.choice(lines) for _ in range(scale)]))
+    return inputs
+
+
+def timeStages(kind, bundle, batch):
+    """Run one batch through the bundle and return the seconds spent in each stage"""
+    timings = {}
+    start = time.perf_counter()
+    if kind == 'compiled':
+        bundle.predict(batch)
+        timings['predict'] = time.perf_counter() - start
+        return timings
+    wordTfIdfVect, charTfIdfVect, classifier = bundle
+    wordTfIdf = wordTfIdfVect.transform(batch)
+    timings['word_transform'] = time.perf_counter() - start
+    start = time.perf_counter()
+    charTfIdf = charTfIdfVect.transform(batch)
+    timings['char_transform'] = time.perf_counter() - start
+    start = time.perf_counter()
+    combinedTfIdf = hstack([wordTfIdf, charTfIdf])
+    timings['hstack'] = time.perf_counter() - start
+    start = time.perf_counter()
+    classifier.predict(combinedTfIdf)
+    timings['predict'] = time.perf_counter() - start
+    return timings
+
+
+def peakRssMb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def benchmarkBundle(task):
+    """Measure one bundle; runs in a fresh process so load is cold and RSS is its own"""
+    name, kind, language, files, scales, batchSize, seed, store = task
+    # Version mismatch warnings from old pickles would drown the report
+    warnings.simplefilter('ignore', UserWarning)
+    result = {'kind': kind, 'files': [os.path.relpath(f, ROOT_DIR) for f in files]}
+    try:
+        start = time.perf_counter()
+        loadBundle(kind, files)
+        coldLoad = time.perf_counter() - start
+        start = time.perf_counter()
+        bundle = loadBundle(kind, files)
+        warmLoad = time.perf_counter() - start
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        return name, result
+    result['load'] = {'cold_seconds': coldLoad, 'warm_seconds': warmLoad}
+
+    result['inputs'] = {}
+    timeStages(kind, bundle, testLines(language, store)[1][:100])
+    for inputName, lines in benchmarkInputs(language, scales, seed, store):
+        stageTimes = {}
+        start = time.perf_counter()
+        for offset in range(0, len(lines), batchSize):
+            for stage, seconds in timeStages(kind, bundle, lines[offset:offset + batchSize]).items():
+                stageTimes.setdefault(stage, []).append(seconds)
+        elapsed = time.perf_counter() - start
+        batchTimes = np.sum(list(stageTimes.values()), axis=0)
+        stages = {stage: {'total_seconds': float(np.sum(times)),
+                          'p50_seconds': float(np.percentile(times, 50)),
+                          'p99_seconds': float(np.percentile(times, 99))}
+                  for stage, times in stageTimes.items()}
+        result['inputs'][inputName] = {
+            'lines': len(lines),
+            'batches': len(batchTimes),
+            'lines_per_sec': len(lines) / elapsed if elapsed else 0.0,
+            'batch_p50_seconds': float(np.percentile(batchTimes, 50)),
+            'batch_p99_seconds': float(np.percentile(batchTimes, 99)),
+            'stages': stages,
+        }
+    result['peak_rss_mb'] = peakRssMb()
+    return name, result
+
+
+def flattenMetrics(results):
+    """Map 'bundle/input/metric' paths to the values compared against a baseline"""
+    metrics = {}
+    for name, result in results.items():
+        if 'error' in result:
+            continue
+        metrics[f'{name}/load/cold_seconds'] = result['load']['cold_seconds']
+        metrics[f'{name}/load/warm_seconds'] = result['load']['warm_seconds']
+        metrics[f'{name}/peak_rss_mb'] = result['peak_rss_mb']
+        for inputName, measured in result['inputs'].items():
+            for metric in ('lines_per_sec', 'batch_p50_seconds', 'batch_p99_seconds'):
+                metrics[f'{name}/{inputName}/{metric}'] = measured[metric]
+    return metrics
+
+
+def compareWithBaseline(results, baseline, tolerance, minDelta=MIN_REGRESSION_DELTA):
+    """Return a message for every metric worse than the baseline by more than ``tolerance``.
+
+    A metric must also be worse by at least ``minDelta`` of its kind (the
+    suffix of its name) in absolute terms.
+    """
+    current = flattenMetrics(results)
+    regressions = []
+    for path, before in flattenMetrics(baseline['results']).items():
+        after = current.get(path)
+        if after is None or before <= 0:
+            continue
+        worse = before - after if path.endswith(HIGHER_IS_BETTER) else after - before
+        change = worse / before
+        floor = next((delta for kind, delta in minDelta.items() if path.endswith(kind)), 0.0)
+        if change > tolerance and worse >= floor:
+            regressions.append(f'{path}: {before:.4g} -> {after:.4g} ({change:+.0%} worse)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark load, vectorize and predict for every model bundle in Model2/ and Codes/. "
+                    "Each bundle runs in a fresh process over its language's test file and synthetic inputs.")
+    parser.add_argument('--scales', nargs='+', type=int, default=[10000, 100000],
+                        help="synthetic input sizes in lines, e.g. 10000 1000000")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--bundles', nargs='+', help="only these bundle names, e.g. hindi-svm hindi-compiled")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_REGRESSION_DELTA['seconds'] * 1000,
+                        help="smallest load or batch time increase that counts as a regression")
+    parser.add_argument('--min-delta-mb', type=float, default=MIN_REGRESSION_DELTA['rss_mb'],
+                        help="smallest peak RSS increase that counts as a regression")
+    parser.add_argument('--store', help="take the test lines from the test splits of this dataset store")
+    args = parser.parse_args()
+
+    bundles = [b for b in shippedBundles() if not args.bundles or b[0] in args.bundles]
+    results = {}
+    # One process per bundle: cold loads are really cold and peak RSS is not shared
+    context = multiprocessing.get_context('spawn')
+    for name, kind, language, files in bundles:
+        with context.Pool(1) as pool:
+            _, result = pool.apply(benchmarkBundle, ((name, kind, language, files, args.scales,
+                                                      args.batch_size, args.seed, args.store),))
+        results[name] = result
+        if 'error' in result:
+            print(f"{name}: {result['error']}")
+            continue
+        print(f"{name}: cold load {result['load']['cold_seconds'] * 1000:.1f}ms, "
+              f"warm load {result['load']['warm_seconds'] * 1000:.1f}ms, peak RSS {result['peak_rss_mb']:.0f}MB")
+        for inputName, measured in result['inputs'].items():
+            print(f"  {inputName:24} {measured['lines_per_sec']:10.0f} lines/sec  "
+                  f"batch p50 {measured['batch_p50_seconds'] * 1000:8.2f}ms  "
+                  f"p99 {measured['batch_p99_seconds'] * 1000:8.2f}ms")
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'sklearn': sklearn.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'settings': {'scales': args.scales, 'batch_size': args.batch_size, 'seed': args.seed},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as outputFile:
+        json.dump(report, outputFile, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baselineFile:
+            regressions = compareWithBaseline(results, json.load(baselineFile), args.tolerance,
+                                              {'seconds': args.min_delta_ms / 1000, 'rss_mb': args.min_delta_mb})
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+import re
+from itertools import repeat
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags, hstack
+
+WHITE_SPACES = re.compile(r"\s\s+")
+SUPPORTED_ANALYZERS = ('word', 'char')
+
+
+def vectorizer_idf(vect):
+    """Return the IDF vector of a fitted TfidfVectorizer, or None without IDF.
+
+    Pickles written by older scikit-learn versions keep the IDF on the
+    diagonal of ``_idf_diag`` instead of in ``idf_``.
+    """
+    if not vect.use_idf:
+        return None
+    tfidf = getattr(vect, '_tfidf', vect)
+    if 'idf_' in vars(tfidf):
+        return np.asarray(tfidf.idf_, dtype=np.float64)
+    idf_diag = getattr(tfidf, '_idf_diag', None)
+    if idf_diag is None:
+        raise ValueError("Vectorizer has no fitted IDF weights")
+    return np.asarray(idf_diag.diagonal(), dtype=np.float64)
+
+
+def vectorizer_config(vect):
+    """Extract the tokenizer/weighting settings the compiled predictor supports"""
+    if not hasattr(vect, 'vocabulary_'):
+        raise ValueError(f"{type(vect).__name__} has no vocabulary; hashed features cannot be compiled")
+    if vect.analyzer not in SUPPORTED_ANALYZERS:
+        raise ValueError(f"Unsupported analyzer: {vect.analyzer!r}")
+    unsupported = {
+        'preprocessor': vect.preprocessor,
+        'tokenizer': vect.tokenizer,
+        'stop_words': vect.stop_words,
+        'strip_accents': vect.strip_accents,
+    }
+    for name, value in unsupported.items():
+        if value is not None:
+            raise ValueError(f"Unsupported vectorizer setting {name}={value!r}")
+    if vect.norm not in ('l1', 'l2', None):
+        raise ValueError(f"Unsupported norm: {vect.norm!r}")
+    return {
+        'analyzer': vect.analyzer,
+        'ngram_range': list(vect.ngram_range),
+        'lowercase': bool(vect.lowercase),
+        'token_pattern': vect.token_pattern,
+        'binary': bool(vect.binary),
+        'sublinear_tf': bool(vect.sublinear_tf),
+        'norm': vect.norm,
+    }
+
+
+class FeatureBlock:
+    """One vectorizer's vocabulary with its IDF and folded class weights.
+
+    ``weights[j]`` holds ``idf[j] * coef[:, j]`` so a document's class scores
+    are ``sum_j tf_j * weights[j] / norm`` where the norm is taken over
+    ``tf_j * idf[j]`` exactly as TfidfVectorizer normalises its rows.
+    Weights may be stored as float16, or as int8 with one ``scales`` entry
+    per class; only the rows a batch touches are then widened to float32.
+    """
+
+    def __init__(self, config, terms, idf, weights, char_keys=None, scales=None):
+        self.config = config
+        self.terms = terms
+        self.idf = idf
+        self.weights = weights
+        self.scales = scales
+        # Sparse products need float32/64 on both sides
+        self._dtype = weights.dtype if weights.dtype in (np.float32, np.float64) else np.dtype(np.float32)
+        self._token_re = re.compile(config['token_pattern'])
+        self.vocabulary = None
+        self.char_keys = char_keys
+        if char_keys is None and config['analyzer'] == 'char':
+            self.char_keys = CharNgramKeys.build(list(terms), config['ngram_range'])
+        if self.char_keys is None:
+            self.vocabulary = dict(zip(terms, range(len(terms))))
+
+    def _preprocess(self, doc):
+        if self.config['lowercase']:
+            doc = doc.lower()
+        if self.config['analyzer'] == 'char':
+            doc = WHITE_SPACES.sub(" ", doc)
+        return doc
+
+    def analyze(self, doc):
+        """Return the n-grams of ``doc`` as TfidfVectorizer would produce them"""
+        doc = self._preprocess(doc)
+        min_n, max_n = self.config['ngram_range']
+        if self.config['analyzer'] == 'char':
+            return [doc[i:i + n]
+                    for n in range(min_n, min(max_n + 1, len(doc) + 1))
+                    for i in range(len(doc) - n + 1)]
+        tokens = self._token_re.findall(doc)
+        if max_n == 1:
+            return tokens
+        return [" ".join(tokens[i:i + n])
+                for n in range(min_n, min(max_n + 1, len(tokens) + 1))
+                for i in range(len(tokens) - n + 1)]
+
+    def _lookup(self, lines):
+        """Return parallel (row, feature id) arrays for every in-vocabulary n-gram"""
+        if self.char_keys is not None:
+            return self.char_keys.lookup([self._preprocess(line) for line in lines])
+        vocab_get = self.vocabulary.get
+        ids = []
+        rows = []
+        for row, line in enumerate(lines):
+            found = [j for j in map(vocab_get, self.analyze(line), repeat(-1)) if j >= 0]
+            ids.extend(found)
+            rows.extend(repeat(row, len(found)))
+        return np.asarray(rows, dtype=np.int64), np.asarray(ids, dtype=np.int64)
+
+    def features(self, lines):
+        """Return the (n_lines, n_features) normalised term frequencies that ``weights`` apply to"""
+        rows, ids = self._lookup(lines)
+        n_features = len(self.idf)
+        if not len(ids):
+            return csr_matrix((len(lines), n_features), dtype=self._dtype)
+
+        # Collapse repeated n-grams into (row, feature) term frequencies.
+        keys, tf = np.unique(rows * n_features + ids, return_counts=True)
+        rows, ids = np.divmod(keys, n_features)
+        tf = tf.astype(np.float64)
+        if self.config['binary']:
+            tf[:] = 1.0
+        elif self.config['sublinear_tf']:
+            tf = np.log(tf) + 1.0
+
+        norm = self.config['norm']
+        if norm is not None:
+            weighted = tf * self.idf[ids]
+            if norm == 'l2':
+                row_norms = np.sqrt(np.bincount(rows, weights=weighted * weighted, minlength=len(lines)))
+            else:
+                row_norms = np.bincount(rows, weights=np.abs(weighted), minlength=len(lines))
+            row_norms[row_norms == 0.0] = 1.0
+            tf = tf / row_norms[rows]
+
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(lines)))))
+        tf = tf.astype(self._dtype, copy=False)
+        return csr_matrix((tf, ids, indptr), shape=(len(lines), n_features))
+
+    def scores(self, lines):
+        """Return the (n_lines, n_classes) contribution of this block"""
+        features = self.features(lines)
+        if self.weights.dtype == self._dtype:
+            return np.asarray(features @ self.weights)
+        # Gather and widen only the weight rows this batch uses
+        touched = csr_matrix((features.data, np.arange(len(features.indices)), features.indptr),
+                             shape=(len(lines), len(features.indices)))
+        scores = np.asarray(touched @ self.weights[features.indices].astype(self._dtype))
+        return scores * self.scales if self.scales is not None else scores
+
+    def dense_weights(self):
+        """The weights as float64, with any int8 scales applied"""
+        weights = np.asarray(self.weights, dtype=np.float64)
+        return weights * self.scales if self.scales is not None else weights
+
+
+class CharNgramKeys:
+    """Vectorised lookup of character n-grams packed into int64 keys.
+
+    Every character of the vocabulary gets a code in ``1..len(alphabet)``;
+    an n-gram's key is its codes read as digits in base ``len(alphabet) + 2``.
+    Characters outside the alphabet get the sentinel code, and any n-gram
+    containing one cannot be in the vocabulary, so it is dropped. Keys are
+    stored in an open-addressing hash table probed for a whole batch at once.
+    """
+
+    HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, alphabet, ngram_range, table_keys, table_ids):
+        self.alphabet = alphabet
+        self.ngram_range = ngram_range
+        self.base = len(alphabet) + 2
+        self.sentinel = len(alphabet) + 1
+        self.table_keys = table_keys
+        self.table_ids = table_ids
+        self._mask = len(table_keys) - 1
+        self._shift = np.uint64(64 - int(len(table_keys)).bit_length() + 1)
+
+    @classmethod
+    def build(cls, terms, ngram_range):
+        """Index ``terms``, or return None when keys would not fit in 63 bits"""
+        chars = sorted({ch for term in terms for ch in term})
+        if (len(chars) + 2) ** ngram_range[1] >= 2 ** 63:
+            return None
+        alphabet = np.frombuffer(''.join(chars).encode('utf-32-le'), dtype=np.uint32)
+        # A power-of-two table at most half full keeps probe chains short.
+        size = 1 << max(4, (2 * len(terms)).bit_length())
+        index = cls(alphabet, ngram_range, np.full(size, -1, dtype=np.int64), np.zeros(size, dtype=np.int32))
+
+        lengths = np.fromiter(map(len, terms), dtype=np.int64, count=len(terms))
+        codes = index._codes(''.join(terms))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        keys = np.zeros(len(terms), dtype=np.int64)
+        scale = 1
+        for t in range(int(lengths.max(initial=0))):
+            has_char = lengths > t
+            keys[has_char] += codes[starts[has_char] + t] * scale
+            scale *= index.base
+
+        table_keys = index.table_keys
+        for term_id, (key, slot) in enumerate(zip(keys.tolist(), index._slots(keys).tolist())):
+            while table_keys[slot] != -1:
+                slot = (slot + 1) & index._mask
+            table_keys[slot] = key
+            index.table_ids[slot] = term_id
+        return index
+
+    def _slots(self, keys):
+        return ((keys.astype(np.uint64) * self.HASH_MULTIPLIER) >> self._shift).astype(np.int64)
+
+    def _codes(self, text):
+        points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        pos = np.searchsorted(self.alphabet, points)
+        pos[pos == len(self.alphabet)] = 0
+        return np.where(self.alphabet[pos] == points, pos + 1, self.sentinel).astype(np.int64)
+
+    def find(self, keys):
+        """Return the term id of every key, or -1 for keys not in the vocabulary"""
+        ids = np.full(len(keys), -1, dtype=np.int64)
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending):
+            probe = slots[pending]
+            stored = self.table_keys[probe]
+            found = stored == keys[pending]
+            ids[pending[found]] = self.table_ids[probe[found]]
+            pending = pending[~found & (stored != -1)]
+            slots[pending] = (slots[pending] + 1) & self._mask
+        return ids
+
+    def lookup(self, docs):
+        """Return parallel (row, feature id) arrays for the n-grams of ``docs``"""
+        lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+        # Separate documents with one sentinel so no window spans two of them.
+        codes = self._codes('\0'.join(docs))
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+        codes[starts[1:] - 1] = self.sentinel
+        rows = np.repeat(np.arange(len(docs), dtype=np.int64), lengths + 1)[:len(codes)]
+        bad = np.concatenate(([0], np.cumsum(codes == self.sentinel)))
+
+        min_n, max_n = self.ngram_range
+        all_rows = []
+        all_ids = []
+        key = np.zeros(len(codes), dtype=np.int64)
+        scale = 1
+        for n in range(1, max_n + 1):
+            # key[i] accumulates the n-gram starting at i, least significant first.
+            width = len(codes) - n + 1
+            if width <= 0:
+                break
+            key = key[:width] + codes[n - 1:] * scale
+            scale *= self.base
+            if n < min_n:
+                continue
+            valid = np.flatnonzero(bad[n:] - bad[:width] == 0)
+            ids = self.find(key[valid])
+            hit = ids >= 0
+            all_rows.append(rows[valid[hit]])
+            all_ids.append(ids[hit])
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(all_rows), np.concatenate(all_ids)
+
+
+class CompiledModel:
+    """Word+char TF-IDF and a linear classifier folded into n-gram weight tables.
+
+    Produces the same labels as ``clf.predict(hstack([word.transform(X),
+    char.transform(X)]))`` without building the TF-IDF matrices.
+    """
+
+    def __init__(self, blocks, classes, intercept, source_hash=None):
+        self.blocks = blocks
+        self.classes = np.asarray(classes)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        # Content hash of the file the model was loaded from, if any
+        self.source_hash = source_hash
+        self._lowercase = all(block.config['lowercase'] for block in blocks)
+
+    def normalize(self, line):
+        """Canonical form of ``line``: lines with equal forms get equal predictions.
+
+        Runs of whitespace are collapsed (the char analyzer does the same and
+        word tokens ignore whitespace), and case is folded when every
+        vectorizer lowercases.
+        """
+        line = WHITE_SPACES.sub(" ", line)
+        return line.lower() if self._lowercase else line
+
+    @classmethod
+    def from_sklearn(cls, vectorizers, clf):
+        """Fold fitted TfidfVectorizers and a linear classifier's coef_ together"""
+        coef = np.asarray(clf.coef_, dtype=np.float64)
+        if coef.ndim == 1:
+            coef = coef[None, :]
+        blocks = []
+        offset = 0
+        for vect in vectorizers:
+            config = vectorizer_config(vect)
+            n_features = len(vect.vocabulary_)
+            idf = vectorizer_idf(vect)
+            if idf is None:
+                idf = np.ones(n_features, dtype=np.float64)
+            weights = coef[:, offset:offset + n_features].T * idf[:, None]
+            terms = sorted(vect.vocabulary_, key=vect.vocabulary_.get)
+            blocks.append(FeatureBlock(config, terms, idf, np.ascontiguousarray(weights)))
+            offset += n_features
+        if offset != coef.shape[1]:
+            raise ValueError(f"Classifier expects {coef.shape[1]} features, vectorizers provide {offset}")
+        intercept = np.broadcast_to(np.asarray(clf.intercept_, dtype=np.float64), (coef.shape[0],))
+        return cls(blocks, clf.classes_, intercept)
+
+    def tfidf(self, lines):
+        """The ``hstack`` of the original vectorizers' TF-IDF rows for ``lines``.
+
+        With ``coef()`` this is the classifier's own feature space:
+        ``tfidf(lines) @ coef().T + intercept`` equals ``decision_function``.
+        """
+        return hstack([block.features(lines) @ diags(np.asarray(block.idf, dtype=np.float64))
+                       for block in self.blocks]).tocsr()
+
+    def coef(self):
+        """The classifier's (n_classes, n_features) ``coef_``, unfolded from the weight tables"""
+        idf = np.concatenate([block.idf for block in self.blocks]).astype(np.float64)
+        weights = np.vstack([block.dense_weights() for block in self.blocks])
+        return np.ascontiguousarray((weights / idf[:, None]).T)
+
+    def with_coef(self, coef, intercept):
+        """A model with this one's vocabularies and IDF folded with a new ``coef_`` and intercept"""
+        coef = np.asarray(coef, dtype=np.float64)
+        blocks = []
+        offset = 0
+        for block in self.blocks:
+            n_features = len(block.idf)
+            weights = np.ascontiguousarray(coef[:, offset:offset + n_features].T * block.idf[:, None])
+            blocks.append(FeatureBlock(block.config, block.terms, block.idf, weights, block.char_keys))
+            offset += n_features
+        return CompiledModel(blocks, self.classes, intercept)
+
+    def decision_function(self, lines, batch_size=4096):
+        """Class scores for ``lines``, computed ``batch_size`` lines at a time"""
+        lines = list(lines)
+        scores = np.tile(self.intercept, (len(lines), 1))
+        for start in range(0, len(lines), batch_size):
+            batch = lines[start:start + batch_size]
+            for block in self.blocks:
+                scores[start:start + len(batch)] += block.scores(batch)
+        return scores
+
+    def predict(self, lines, batch_size=4096):
+        scores = self.decision_function(lines, batch_size)
+        if scores.shape[1] == 1:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+    def predict_with_scores(self, lines, batch_size=4096):
+        """Labels of ``lines`` and the decision score of each predicted label"""
+        scores = self.decision_function(lines, batch_size)
+        if scores.shape[1] == 1:
+            positive = scores[:, 0] > 0
+            return self.classes[positive.astype(int)], np.where(positive, scores[:, 0], -scores[:, 0])
+        best = scores.argmax(axis=1)
+        return self.classes[best], scores[np.arange(len(best)), best]
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import time
+import warnings
+from pickle import load
+
+import numpy as np
+
+from compiled_model import CompiledModel, FeatureBlock
+from dataset_store import read_spec
+from model_artifact import StringTable, load_model, save_model
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'datasets'))
+
+# Held-out file of each language bundle, picked by the model file's name prefix
+LANGUAGE_TEST_FILES = {
+    'hindi': 'test-data.txt',
+    'marathi': 'test-data-marathi.txt',
+    'telugu': 'test-data-telugu.txt',
+}
+
+DTYPES = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}
+
+
+def loadObjectFromFile(filePath):
+    with open(filePath, 'rb') as fileLoad:
+        return load(fileLoad)
+
+
+def loadSourceModel(paths):
+    """A compiled model file, or word vectorizer, char vectorizer and classifier pickles"""
+    if len(paths) == 1:
+        return load_model(paths[0])
+    if len(paths) != 3:
+        raise ValueError("Give one compiled .bin or the word, char and classifier pickles")
+    with warnings.catch_warnings():
+        # Pickles from older scikit-learn versions load with a version warning
+        warnings.simplefilter('ignore')
+        wordTfIdfVect, charTfIdfVect, classifier = [loadObjectFromFile(path) for path in paths]
+    return CompiledModel.from_sklearn([wordTfIdfVect, charTfIdfVect], classifier)
+
+
+def documentFrequencies(idf):
+    """Recover document frequencies from a smoothed IDF: idf = ln((1 + n) / (1 + df)) + 1.
+
+    The number of training documents n is not stored, but the rarest n-gram
+    of a vocabulary fitted with min_df=1 occurs in exactly one document,
+    which pins it down.
+    """
+    idf = np.asarray(idf, dtype=np.float64)
+    nDocs = 2 * np.exp(idf.max() - 1) - 1
+    return np.rint((1 + nDocs) / np.exp(idf - 1) - 1)
+
+
+def pruneBlock(block, method, level):
+    """Keep the n-grams of a block that pass the pruning criterion.
+
+    coef: drop the ``level`` fraction of n-grams with the smallest largest
+    absolute class weight. df: drop n-grams seen in fewer than ``level``
+    training documents.
+    """
+    weights = block.dense_weights()
+    if method == 'coef':
+        magnitude = np.abs(weights).max(axis=1)
+        nKeep = int(np.ceil(len(magnitude) * (1 - level)))
+        keep = np.sort(np.argsort(-magnitude, kind='stable')[:nKeep])
+    else:
+        keep = np.flatnonzero(documentFrequencies(block.idf) >= level)
+    terms = block.terms.tolist() if isinstance(block.terms, StringTable) else list(block.terms)
+    return FeatureBlock(block.config, [terms[i] for i in keep], np.asarray(block.idf, dtype=np.float64)[keep],
+                        np.ascontiguousarray(weights[keep]))
+
+
+def pruneModel(model, method, level, analyzers):
+    blocks = [pruneBlock(block, method, level) if block.config['analyzer'] in analyzers else block
+              for block in model.blocks]
+    return CompiledModel(blocks, model.classes, model.intercept)
+
+
+def readTestFile(filePath, classes):
+    """Lines of a test file with their labels, when the lines end in a label as test-data.txt does.
+
+    Returns ``(texts, labels)``; labels is None unless at least 90% of the
+    lines end with one of the model's classes. A dataset store spec gives its
+    own labels, under the same rule.
+    """
+    store = read_spec(filePath)
+    if store is not None:
+        labelled = store.labelled()
+        if len(labelled) < 0.9 * len(store):
+            return store.texts(), None
+        return labelled.texts(), labelled.labels()
+    with open(filePath, 'r', encoding='utf-8') as fileRead:
+        lines = [line.strip() for line in fileRead if line.strip()]
+    classes = set(str(c) for c in classes)
+    split = [line.rsplit(' ', 1) for line in lines]
+    labelled = [len(parts) == 2 and parts[1] in classes for parts in split]
+    if sum(labelled) < 0.9 * len(lines):
+        return lines, None
+    return ([parts[0] for parts, ok in zip(split, labelled) if ok],
+            [parts[1] for parts, ok in zip(split, labelled) if ok])
+
+
+def measureModel(path, testSets, referencePredictions, benchLines, loadRepeats=5):
+    """Size, load time, lines/sec, and accuracy and agreement with the reference on every test set"""
+    loadTimes = []
+    for _ in range(loadRepeats):
+        start = time.perf_counter()
+        model = load_model(path)
+        loadTimes.append(time.perf_counter() - start)
+
+    allTexts = [text for texts, _ in testSets.values() for text in texts]
+    bench = (allTexts * (benchLines // len(allTexts) + 1))[:benchLines]
+    model.predict(bench[:1000])
+    start = time.perf_counter()
+    model.predict(bench)
+    benchSeconds = time.perf_counter() - start
+
+    result = {
+        'file_bytes': os.path.getsize(path),
+        'terms': {block.config['analyzer']: len(block.terms) for block in model.blocks},
+        'load_seconds': float(np.median(loadTimes)),
+        'lines_per_second': len(bench) / benchSeconds,
+        'test_sets': {},
+    }
+    for name, (texts, labels) in testSets.items():
+        predictions = model.predict(texts).astype(str)
+        scores = {'agreement': float(np.mean(predictions == referencePredictions[name]))}
+        if labels is not None:
+            scores['accuracy'] = float(np.mean(predictions == np.asarray(labels)))
+        result['test_sets'][name] = scores
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Shrink a compiled model by pruning n-grams and quantizing the weights. Every pruning level "
+                    "and weight type is written out and measured for size, load time, inference speed and "
+                    "accuracy against the uncompressed model.")
+    parser.add_argument('source', nargs='+',
+                        help="a compiled .bin, or the word vectorizer, char vectorizer and classifier pickles")
+    parser.add_argument('--method', choices=['coef', 'df'], default='coef',
+                        help="coef: levels are the fraction of n-grams removed, smallest weights first; "
+                             "df: levels are the minimum document frequency kept")
+    parser.add_argument('--levels', nargs='+', type=float, default=None,
+                        help="default 0.5 0.8 0.9 0.95 for coef, 1 2 3 5 for df; the unpruned model "
+                             "(level 0) is always measured as the baseline")
+    parser.add_argument('--dtypes', nargs='+', choices=list(DTYPES), default=list(DTYPES))
+    parser.add_argument('--analyzers', nargs='+', choices=['word', 'char'], default=['char'],
+                        help="blocks to prune; the small word vocabulary is kept whole by default")
+    parser.add_argument('--test-file', action='append', dest='testFiles',
+                        help="default: the datasets/ test file of the model's language, or all of them")
+    parser.add_argument('--bench-lines', type=int, default=20000)
+    parser.add_argument('--output-dir', default='compressed-models')
+    parser.add_argument('--report', default=None, help="default: <output-dir>/compression-report.json")
+    args = parser.parse_args()
+
+    levels = args.levels or ([0.5, 0.8, 0.9, 0.95] if args.method == 'coef' else [1, 2, 3, 5])
+    # Level 0 keeps every n-gram under both methods: the unpruned source is always measured first
+    levels = [0] + [level for level in levels if level != 0]
+    stem = os.path.splitext(os.path.basename(args.source[-1]))[0]
+    language = stem.split('-')[0]
+    testFiles = args.testFiles or [os.path.join(DATASETS_DIR, name) for name in (
+        [LANGUAGE_TEST_FILES[language]] if language in LANGUAGE_TEST_FILES else LANGUAGE_TEST_FILES.values())]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    source = loadSourceModel(args.source)
+    testSets = {os.path.basename(path): readTestFile(path, source.classes) for path in testFiles}
+    referencePredictions = {name: source.predict(texts).astype(str) for name, (texts, _) in testSets.items()}
+
+    # The uncompressed float32 model is the baseline every other row is compared with
+    rows = []
+    for level in levels:
+        pruned = pruneModel(source, args.method, level, args.analyzers) if level else source
+        for dtypeName in (['float32'] + [d for d in args.dtypes if d != 'float32'] if not rows else args.dtypes):
+            path = os.path.join(args.output_dir, f'{stem}-{args.method}-{level:g}-{dtypeName}.bin')
+            save_model(pruned, path, DTYPES[dtypeName])
+            row = {'level': level, 'dtype': dtypeName, 'path': path,
+                   **measureModel(path, testSets, referencePredictions, args.bench_lines)}
+            rows.append(row)
+
+    baseline = rows[0]
+    print(f"{'level':>6} {'dtype':>8} {'terms':>9} {'size MB':>8} {'load ms':>8} {'lines/s':>9} "
+          f"{'size':>6} {'speed':>6}  accuracy / agreement per test file")
+    for row in rows:
+        row['size_ratio'] = row['file_bytes'] / baseline['file_bytes']
+        row['speedup'] = row['lines_per_second'] / baseline['lines_per_second']
+        for name, scores in row['test_sets'].items():
+            if 'accuracy' in scores:
+                scores['accuracy_delta'] = scores['accuracy'] - baseline['test_sets'][name]['accuracy']
+        quality = '  '.join(
+            f"{name}: " + (f"{s['accuracy']:.4f} ({s['accuracy_delta']:+.4f}) / " if 'accuracy' in s else '')
+            + f"{s['agreement']:.4f}" for name, s in row['test_sets'].items())
+        print(f"{row['level']:>6g} {row['dtype']:>8} {sum(row['terms'].values()):>9} "
+              f"{row['file_bytes'] / 2 ** 20:>8.2f} {row['load_seconds'] * 1000:>8.1f} "
+              f"{row['lines_per_second']:>9.0f} {row['size_ratio']:>6.2f} {row['speedup']:>6.2f}  {quality}")
+
+    reportPath = args.report or os.path.join(args.output_dir, 'compression-report.json')
+    with open(reportPath, 'w', encoding='utf-8') as reportFile:
+        json.dump({'source': args.source, 'method': args.method, 'analyzers': args.analyzers, 'results': rows},
+                  reportFile, indent=2)
+    print(f"Models written to {args.output_dir}, report to {reportPath}")
+
+
+if __name__ == '__main__':
+    main()
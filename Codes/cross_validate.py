@@ -0,0 +1,252 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import warnings
+
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+from sklearn.model_selection import KFold, StratifiedKFold
+
+from dataset_store import read_examples
+from feature_cache import FeatureCache
+from train_models_with_pandas_word_char_TFIDF import createTFIDFVectorsFromTrainData, readLinesFromFile
+from train_sweep import (CLASSIFIERS_WITH_C, DATASETS_DIR, LANGUAGE_DATASETS, createClassifier,
+                         parseNgramRange)
+
+# Fold matrices and labels, filled in the parent before the fit pool forks so workers share them
+sharedFeatures = {}
+
+
+def readDataset(dataFile, labelFile):
+    examples = read_examples(dataFile)
+    if examples is not None:
+        return examples
+    data = readLinesFromFile(dataFile)
+    labels = readLinesFromFile(labelFile)
+    if len(data) != len(labels):
+        raise ValueError(f"{dataFile} has {len(data)} lines but {labelFile} has {len(labels)}")
+    return data, labels
+
+
+def createFolds(labels, folds, seed):
+    """Stratified (train indexes, test indexes) pairs, or plain shuffled folds if no label has enough examples"""
+    x = np.zeros(len(labels))
+    try:
+        with warnings.catch_warnings():
+            # Labels rarer than the number of folds (stray lines in the label files) only trigger a warning
+            warnings.simplefilter('ignore', UserWarning)
+            return list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(x, labels))
+    except ValueError:
+        return list(KFold(n_splits=folds, shuffle=True, random_state=seed).split(x, labels))
+
+
+def vectorizeFold(task):
+    """Fit one vectorizer on a fold's training lines and transform its test lines"""
+    dataset, fold, analyzer, ngramRange, trainData, testData, cacheDir = task
+    start = time.perf_counter()
+    if cacheDir:
+        _, trainTfIdf, (testTfIdf,) = FeatureCache(cacheDir).fit_transform(
+            trainData, analyzer, ngramRange, transform_data=[testData])
+    else:
+        trainTfIdf, tfIdfVect = createTFIDFVectorsFromTrainData(trainData, analyzer, ngramRange)
+        testTfIdf = tfIdfVect.transform(testData)
+    return (dataset, fold, analyzer, ngramRange), (trainTfIdf, testTfIdf, time.perf_counter() - start)
+
+
+def fitFold(task):
+    """Fit one configuration on one fold's shared features and predict the fold's test lines"""
+    (dataset, classifier, wordRange, charRange, C), fold = task
+    wordTrain, wordTest, _ = sharedFeatures[(dataset, fold, 'word', wordRange)]
+    charTrain, charTest, _ = sharedFeatures[(dataset, fold, 'char', charRange)]
+    trainLabels, _ = sharedFeatures[(dataset, fold, 'labels')]
+    with warnings.catch_warnings():
+        # LinearSVC and LogisticRegression may not converge on small folds; that is part of the result
+        warnings.simplefilter('ignore')
+        start = time.perf_counter()
+        clf = createClassifier(classifier, C)
+        clf.fit(hstack([wordTrain, charTrain]).tocsr(), trainLabels)
+        fitSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        predictions = clf.predict(hstack([wordTest, charTest]).tocsr())
+        predictSeconds = time.perf_counter() - start
+    return task, list(predictions), fitSeconds, predictSeconds
+
+
+def scoreConfiguration(labels, foldResults, vectorizeSeconds):
+    """Per-aspect and overall scores of the out-of-fold predictions of one configuration"""
+    actual, predicted, foldAccuracies = [], [], []
+    fitSeconds = predictSeconds = 0.0
+    for foldLabels, predictions, fit, predict in foldResults:
+        actual += foldLabels
+        predicted += predictions
+        foldAccuracies.append(accuracy_score(foldLabels, predictions))
+        fitSeconds += fit
+        predictSeconds += predict
+    aspects = sorted(set(labels))
+    precision, recall, f1, support = precision_recall_fscore_support(
+        actual, predicted, labels=aspects, zero_division=0)
+    macro = precision_recall_fscore_support(actual, predicted, labels=aspects, average='macro', zero_division=0)
+    return {
+        'accuracy': accuracy_score(actual, predicted),
+        'fold_accuracy_mean': float(np.mean(foldAccuracies)),
+        'fold_accuracy_std': float(np.std(foldAccuracies)),
+        'macro_precision': macro[0],
+        'macro_recall': macro[1],
+        'macro_f1': macro[2],
+        'per_aspect': {aspect: {'precision': p, 'recall': r, 'f1': f, 'support': int(s)}
+                       for aspect, p, r, f, s in zip(aspects, precision, recall, f1, support)},
+        'confusion_matrix': {'labels': aspects,
+                             'matrix': confusion_matrix(actual, predicted, labels=aspects).tolist()},
+        'timing': {'vectorize_seconds': vectorizeSeconds, 'fit_seconds': fitSeconds,
+                   'predict_seconds': predictSeconds},
+    }
+
+
+def shortLabel(label, width=20):
+    return label if len(label) <= width else label[:width - 3] + '...'
+
+
+def printConfusionMatrix(confusion):
+    labels = [shortLabel(label) for label in confusion['labels']]
+    width = max(len(label) for label in labels + ['actual'])
+    cell = max(6, max(len(str(n)) for row in confusion['matrix'] for n in row) + 1)
+    print(f"  {'actual':>{width}} | " + ''.join(f'{label[:cell - 1]:>{cell}}' for label in labels))
+    for label, row in zip(labels, confusion['matrix']):
+        print(f"  {label:>{width}} | " + ''.join(f'{n:>{cell}}' for n in row))
+
+
+def printReport(name, configName, score):
+    print(f"\n{name}, best configuration {configName}: accuracy {score['accuracy']:.4f}, "
+          f"macro F1 {score['macro_f1']:.4f}")
+    print(f"  {'aspect':20} {'precision':>9} {'recall':>9} {'f1':>9} {'support':>8}")
+    for aspect, s in score['per_aspect'].items():
+        print(f"  {shortLabel(aspect):20} {s['precision']:9.4f} {s['recall']:9.4f} {s['f1']:9.4f} "
+              f"{s['support']:8}")
+    printConfusionMatrix(score['confusion_matrix'])
+
+
+def describeConfiguration(classifier, wordRange, charRange, C):
+    text = f"{classifier} word {wordRange[0]}-{wordRange[1]} char {charRange[0]}-{charRange[1]}"
+    return text if C is None else f"{text} C={C}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stratified k-fold cross-validation of classifier x n-gram configurations on datasets/ "
+                    "text+label pairs. Fold features are vectorized once on a process pool and shared by every "
+                    "classifier; the fold fits run on a second pool. Reports per-aspect precision/recall/F1, a "
+                    "confusion matrix and timing for each configuration.")
+    parser.add_argument('--languages', nargs='*', default=None, choices=list(LANGUAGE_DATASETS),
+                        help="language bundles to evaluate (default: all, unless --pair is given)")
+    parser.add_argument('--pair', nargs=2, action='append', default=[], metavar=('DATA', 'LABELS'),
+                        help="any other data and label file, or a dataset store spec and -; may be repeated")
+    parser.add_argument('--store', help="read the --languages from the train splits of this dataset store")
+    parser.add_argument('--classifiers', nargs='+', default=['svm', 'logistic', 'multi-nb', 'sgd'],
+                        choices=['svm', 'logistic', 'multi-nb', 'sgd'])
+    parser.add_argument('--word-ngrams', nargs='+', default=['1-1'], help="e.g. 1-1 1-2")
+    parser.add_argument('--char-ngrams', nargs='+', default=['2-5'], help="e.g. 2-4 2-5")
+    parser.add_argument('--C', nargs='+', type=float, default=[1.0], dest='cValues')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--cache-dir', help="reuse fold vectorizations across runs (see feature_cache.py)")
+    parser.add_argument('--output', default='cross-validation-report.json')
+    args = parser.parse_args()
+
+    datasets = {}
+    languages = args.languages if args.languages is not None else ([] if args.pair else list(LANGUAGE_DATASETS))
+    for language in languages:
+        if args.store:
+            datasets[language] = (f'{args.store}:{language}:train', None)
+            continue
+        dataFile, labelFile = LANGUAGE_DATASETS[language]
+        datasets[language] = (os.path.join(DATASETS_DIR, dataFile), os.path.join(DATASETS_DIR, labelFile))
+    for dataFile, labelFile in args.pair:
+        name = os.path.basename(dataFile)
+        # Store specs keep their language and split in the name
+        datasets[name if ':' in name else os.path.splitext(name)[0]] = (dataFile, labelFile)
+
+    wordRanges = [parseNgramRange(r) for r in args.word_ngrams]
+    charRanges = [parseNgramRange(r) for r in args.char_ngrams]
+    context = multiprocessing.get_context('fork')
+    runStart = time.perf_counter()
+
+    allLabels = {}
+    vectorizeTasks = []
+    for name, (dataFile, labelFile) in datasets.items():
+        data, labels = readDataset(dataFile, labelFile)
+        print(f"{name}: {len(data)} lines, {len(set(labels))} aspects, {args.folds} folds")
+        allLabels[name] = labels
+        for fold, (trainIndex, testIndex) in enumerate(createFolds(labels, args.folds, args.seed)):
+            trainData = [data[i] for i in trainIndex]
+            testData = [data[i] for i in testIndex]
+            sharedFeatures[(name, fold, 'labels')] = ([labels[i] for i in trainIndex],
+                                                      [labels[i] for i in testIndex])
+            vectorizeTasks += [(name, fold, 'word', r, trainData, testData, args.cache_dir) for r in wordRanges]
+            vectorizeTasks += [(name, fold, 'char', r, trainData, testData, args.cache_dir) for r in charRanges]
+    with context.Pool(min(args.workers, len(vectorizeTasks))) as pool:
+        sharedFeatures.update(pool.imap_unordered(vectorizeFold, vectorizeTasks))
+    vectorizeSeconds = time.perf_counter() - runStart
+    print(f"Vectorized {len(vectorizeTasks)} fold feature sets in {vectorizeSeconds:.1f}s")
+
+    configs = []
+    for name, classifier, wordRange, charRange in itertools.product(
+            datasets, args.classifiers, wordRanges, charRanges):
+        for C in (args.cValues if classifier in CLASSIFIERS_WITH_C else [None]):
+            configs.append((name, classifier, wordRange, charRange, C))
+    tasks = [(config, fold) for config in configs for fold in range(args.folds)]
+
+    foldResults = {config: [None] * args.folds for config in configs}
+    fitStart = time.perf_counter()
+    # Forked after the features exist, so each worker reads them without copying through pickles
+    with context.Pool(min(args.workers, len(tasks))) as pool:
+        for (config, fold), predictions, fitSeconds, predictSeconds in pool.imap_unordered(fitFold, tasks):
+            testLabels = sharedFeatures[(config[0], fold, 'labels')][1]
+            foldResults[config][fold] = (testLabels, predictions, fitSeconds, predictSeconds)
+    fitWallSeconds = time.perf_counter() - fitStart
+
+    results = []
+    for config in configs:
+        name, classifier, wordRange, charRange, C = config
+        # Each configuration is charged the vectorizations it uses, although other configurations share them
+        configVectorizeSeconds = sum(
+            sharedFeatures[(name, fold, analyzer, ngramRange)][2]
+            for fold in range(args.folds) for analyzer, ngramRange in (('word', wordRange), ('char', charRange)))
+        score = scoreConfiguration(allLabels[name], foldResults[config], configVectorizeSeconds)
+        results.append({'dataset': name, 'classifier': classifier, 'word_ngram_range': wordRange,
+                        'char_ngram_range': charRange, 'C': C, **score})
+        timing = score['timing']
+        print(f"{name:12} {describeConfiguration(classifier, wordRange, charRange, C):32} "
+              f"accuracy {score['accuracy']:.4f} (+/- {score['fold_accuracy_std']:.4f}), "
+              f"macro F1 {score['macro_f1']:.4f}, fit {timing['fit_seconds']:.2f}s, "
+              f"predict {timing['predict_seconds']:.2f}s")
+
+    best = {}
+    for result in results:
+        current = best.get(result['dataset'])
+        if current is None or (result['macro_f1'], result['accuracy']) > (current['macro_f1'], current['accuracy']):
+            best[result['dataset']] = result
+    for name, result in best.items():
+        printReport(name, describeConfiguration(result['classifier'], result['word_ngram_range'],
+                                                result['char_ngram_range'], result['C']), result)
+
+    wallSeconds = time.perf_counter() - runStart
+    print(f"\n{len(tasks)} fold fits of {len(configs)} configurations in {wallSeconds:.1f}s wall "
+          f"(vectorize {vectorizeSeconds:.1f}s, fit {fitWallSeconds:.1f}s)")
+    with open(args.output, 'w', encoding='utf-8') as reportFile:
+        json.dump({'folds': args.folds, 'seed': args.seed, 'wall_seconds': wallSeconds,
+                   'vectorize_seconds': vectorizeSeconds, 'fit_wall_seconds': fitWallSeconds,
+                   'results': sorted(results, key=lambda r: (r['dataset'], -r['macro_f1'])),
+                   'best': {name: {k: r[k] for k in ('classifier', 'word_ngram_range', 'char_ngram_range', 'C',
+                                                     'accuracy', 'macro_f1')}
+                            for name, r in best.items()}},
+                  reportFile, indent=2, ensure_ascii=False)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
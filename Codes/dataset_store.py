@@ -0,0 +1,427 @@
+"""Columnar, memory-mapped store of the datasets/ text and label files.
+
+Layout::
+
+    magic (8 bytes) | format version (u32) | header length (u32) | JSON header
+    | sections, each aligned to 64 bytes
+
+One row per example, with four columns: the text as a string table
+(offsets into one contiguous UTF-8 buffer, as in compiled model files) and
+label, language and split as integer codes whose names are kept in the
+header. A label code of -1 marks an unlabelled line. The original file and
+line number of each row are kept too, so validation messages can point at
+the source. ``open_store`` maps the file read-only. A ``DatasetView`` is a
+store plus an array of row numbers, so selecting, slicing and shuffling
+only build index arrays, and text is decoded when a batch is read.
+
+A store is named on the command line as ``path[:language[:split]]``, e.g.
+``datasets/aspects.aspds:hindi:train``; ``read_spec`` returns None for
+anything that is not a store, so entry points can take either a store or a
+plain text file in the same argument.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from collections import Counter
+
+import numpy as np
+
+from model_artifact import ALIGNMENT, StringTable
+
+MAGIC = b'ASPDATA\0'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'datasets'))
+DEFAULT_STORE = os.path.join(DATASETS_DIR, 'aspects.aspds')
+
+# Sources of the default store: training pairs and held-out files ending in their label
+DEFAULT_PAIRS = [
+    ('hindi', 'train', 'training-data.txt', 'hindi-labels.txt'),
+    ('marathi', 'train', 'training-data-marathi.txt', 'marathi-labels.txt'),
+    ('telugu', 'train', 'training-data-telugu.txt', 'telugu-labels.txt'),
+]
+DEFAULT_LABELLED = [
+    ('hindi', 'test', 'test-data.txt'),
+    ('marathi', 'test', 'test-data-marathi.txt'),
+    ('telugu', 'test', 'test-data-telugu.txt'),
+]
+
+# Labels seen fewer times than this in a source are reported as probable stray lines
+RARE_LABEL_COUNT = 3
+
+
+class DatasetStore:
+    """Read-only columns of a dataset store file"""
+
+    def __init__(self, header, sections):
+        self.header = header
+        self.text = StringTable(sections['text_offsets'], sections['text_blob'])
+        self.label_codes = sections['labels']
+        self.language_codes = sections['languages']
+        self.split_codes = sections['splits']
+        self.source_codes = sections['sources']
+        self.source_lines = sections['source_lines']
+        self.label_names = header['labels']
+        self.language_names = header['languages']
+        self.split_names = header['splits']
+        self.source_names = header['sources']
+
+    def __len__(self):
+        return len(self.label_codes)
+
+    def view(self, language=None, split=None):
+        """All rows, or those of one language and/or split, as a DatasetView"""
+        mask = np.ones(len(self), dtype=bool)
+        for value, names, codes in ((language, self.language_names, self.language_codes),
+                                    (split, self.split_names, self.split_codes)):
+            if value is None:
+                continue
+            if value not in names:
+                raise KeyError(f"{value!r} is not in the store (have {', '.join(names)})")
+            mask &= codes == names.index(value)
+        return DatasetView(self, np.flatnonzero(mask))
+
+
+class DatasetView:
+    """Rows of a DatasetStore picked by an index array; slicing and shuffling copy no text"""
+
+    def __init__(self, store, indices):
+        self.store = store
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.texts([key])[0]
+        return DatasetView(self.store, self.indices[key])
+
+    def shuffled(self, seed=None):
+        return DatasetView(self.store, np.random.default_rng(seed).permutation(self.indices))
+
+    def labelled(self):
+        return DatasetView(self.store, self.indices[self.store.label_codes[self.indices] >= 0])
+
+    def texts(self, positions=None):
+        rows = self.indices if positions is None else self.indices[positions]
+        offsets, blob = self.store.text.offsets, self.store.text.blob
+        starts = offsets[rows].astype(np.int64)
+        ends = offsets[rows + 1].astype(np.int64)
+        return [bytes(blob[a:b]).decode('utf-8') for a, b in zip(starts.tolist(), ends.tolist())]
+
+    def labels(self, positions=None):
+        """Label of each row; unlabelled rows give None"""
+        rows = self.indices if positions is None else self.indices[positions]
+        names = self.store.label_names
+        return [names[c] if c >= 0 else None for c in self.store.label_codes[rows].tolist()]
+
+    def batches(self, batch_size):
+        """Yield ``(texts, labels)`` lists of at most ``batch_size`` rows in view order"""
+        for start in range(0, len(self), batch_size):
+            positions = slice(start, start + batch_size)
+            yield self.texts(positions), self.labels(positions)
+
+
+def open_store(path):
+    """Map a dataset store file read-only"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a dataset store")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+    header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+    sections = {}
+    for name, spec in header['sections'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        sections[name] = (np.frombuffer(buffer, dtype=dtype, count=count, offset=spec['offset'])
+                          if count else np.empty(spec['shape'], dtype=dtype))
+    return DatasetStore(header, sections)
+
+
+def is_store(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_spec(spec):
+    """The DatasetView named by ``path[:language[:split]]``, or None if ``spec`` is not a store"""
+    if is_store(spec):
+        return open_store(spec).view()
+    path, *selectors = spec.split(':')
+    if len(selectors) > 2 or not is_store(path):
+        return None
+    selectors = [s or None for s in selectors] + [None] * (2 - len(selectors))
+    return open_store(path).view(*selectors)
+
+
+def read_examples(spec):
+    """``(texts, labels)`` of the labelled rows named by ``spec``, or None if it is not a store"""
+    view = read_spec(spec)
+    if view is None:
+        return None
+    view = view.labelled()
+    return view.texts(), view.labels()
+
+
+def read_pair(data_file, label_file):
+    """Rows of a data file and its label file paired by line number: ``[(line number, text, label)]``"""
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = [line.strip() for line in f]
+    with open(label_file, 'r', encoding='utf-8') as f:
+        labels = [line.strip() for line in f]
+    # A final newline shows up as one trailing empty line in one file but not the other
+    while data and not data[-1]:
+        data.pop()
+    while labels and not labels[-1]:
+        labels.pop()
+    issues = []
+    if len(data) != len(labels):
+        issues.append(('error', f"{data_file} has {len(data)} lines but {label_file} has {len(labels)}"))
+    rows = []
+    for number, (text, label) in enumerate(zip(data, labels), 1):
+        if text and label:
+            rows.append((number, text, label))
+        elif text or label:
+            issues.append(('error', f"line {number}: {'label' if text else 'text'} is empty"))
+    return rows, issues
+
+
+def read_labelled(file_path, known_labels):
+    """Rows of a file whose lines end with their label, as test-data.txt does.
+
+    The longest label of ``known_labels`` a line ends with is split off, so
+    multi-word labels work; lines ending in none of them stay unlabelled.
+    """
+    by_length = sorted(known_labels, key=len, reverse=True)
+    rows = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            label = next((l for l in by_length if line.endswith(' ' + l)), None)
+            rows.append((number, line[:-len(label) - 1].rstrip() if label else line, label))
+    return rows
+
+
+def validate_rows(rows, drop_header=True, strip_label_suffix=False):
+    """Check one source's rows; return the rows to keep and ``[(level, message)]``.
+
+    A first row whose label occurs nowhere else and whose text has at most
+    three words is the column header (``text aspect`` / ``aspect``) and is
+    dropped. Labels seen fewer than RARE_LABEL_COUNT times, empty texts and
+    texts that repeat their own label at the end are reported.
+    """
+    issues = []
+    counts = Counter(label for _, _, label in rows if label is not None)
+    if rows and counts[rows[0][2]] == 1 and len(rows[0][1].split()) <= 3:
+        issues.append(('warning', f"line {rows[0][0]}: header row {rows[0][1]!r} / {rows[0][2]!r}"
+                                  + (" dropped" if drop_header else " kept")))
+        if drop_header:
+            counts[rows[0][2]] -= 1
+            rows = rows[1:]
+    for label, count in sorted(counts.items()):
+        if 0 < count < RARE_LABEL_COUNT:
+            lines = [str(number) for number, _, l in rows if l == label]
+            issues.append(('warning', f"label {label!r} appears only on line(s) {', '.join(lines)}"))
+    suffixed = [i for i, (_, text, label) in enumerate(rows) if label and text.endswith(' ' + label)]
+    if suffixed:
+        issues.append(('warning', f"{len(suffixed)} of {len(rows)} texts end with their own label"
+                                  + (" (stripped)" if strip_label_suffix else "")))
+        if strip_label_suffix:
+            for i in suffixed:
+                number, text, label = rows[i]
+                rows[i] = (number, text[:-len(label) - 1].rstrip(), label)
+    for number, text, _ in rows:
+        if not text:
+            issues.append(('error', f"line {number}: text is empty"))
+    return rows, issues
+
+
+def build_store(path, sources, drop_header=True, strip_label_suffix=False):
+    """Validate ``sources`` and write them to a store at ``path``.
+
+    ``sources`` is a list of ``(language, split, data_file, label_file)``; a
+    label_file of None means the lines end with their label. Returns the
+    issues found as ``{source: [(level, message)]}``; if any is an error
+    nothing is written.
+    """
+    columns = {'text': [], 'labels': [], 'languages': [], 'splits': [], 'sources': [], 'source_lines': []}
+    names = {'labels': [], 'languages': [], 'splits': [], 'sources': []}
+    report = {}
+    language_labels = {}
+
+    def code(column, value):
+        if value is None:
+            return -1
+        if value not in names[column]:
+            names[column].append(value)
+        return names[column].index(value)
+
+    # Pairs first, so the label set of each language is known when splitting labelled files
+    for language, split, data_file, label_file in sorted(sources, key=lambda s: s[3] is None):
+        if label_file is None:
+            rows = read_labelled(data_file, language_labels.get(language, ()))
+            issues = []
+            unlabelled = sum(1 for _, _, label in rows if label is None)
+            if unlabelled:
+                issues.append(('warning', f"{unlabelled} of {len(rows)} lines end in no known {language} label"))
+            name = os.path.basename(data_file)
+        else:
+            rows, issues = read_pair(data_file, label_file)
+            name = f'{os.path.basename(data_file)} + {os.path.basename(label_file)}'
+        rows, row_issues = validate_rows(rows, drop_header, strip_label_suffix)
+        report[name] = issues + row_issues
+        language_labels.setdefault(language, set()).update(label for _, _, label in rows if label is not None)
+        source_code = code('sources', os.path.basename(data_file))
+        for number, text, label in rows:
+            columns['text'].append(text)
+            columns['labels'].append(code('labels', label))
+            columns['languages'].append(code('languages', language))
+            columns['splits'].append(code('splits', split))
+            columns['sources'].append(source_code)
+            columns['source_lines'].append(number)
+
+    if any(level == 'error' for issues in report.values() for level, _ in issues):
+        return report
+    text = StringTable.encode(columns['text'])
+    sections = {
+        'text_offsets': text.offsets,
+        'text_blob': text.blob,
+        'labels': np.asarray(columns['labels'], dtype=np.int32),
+        'languages': np.asarray(columns['languages'], dtype=np.uint8),
+        'splits': np.asarray(columns['splits'], dtype=np.uint8),
+        'sources': np.asarray(columns['sources'], dtype=np.uint16),
+        'source_lines': np.asarray(columns['source_lines'], dtype=np.uint32),
+    }
+    _write(path, dict(names, rows=len(columns['text']), sections={}), sections)
+    return report
+
+
+def check_store(store):
+    """Consistency checks of a store file; return a list of problems"""
+    problems = []
+    offsets = store.text.offsets
+    if len(offsets) != len(store) + 1:
+        problems.append(f"{len(offsets) - 1} texts for {len(store)} rows")
+    elif offsets[0] != 0 or offsets[-1] != len(store.text.blob) or np.any(np.diff(offsets.astype(np.int64)) < 0):
+        problems.append("text offsets are not increasing within the buffer")
+    else:
+        try:
+            bytes(store.text.blob).decode('utf-8')
+        except UnicodeDecodeError as e:
+            problems.append(f"text buffer is not UTF-8: {e}")
+    for column, codes, names in (('label', store.label_codes, store.label_names),
+                                 ('language', store.language_codes, store.language_names),
+                                 ('split', store.split_codes, store.split_names),
+                                 ('source', store.source_codes, store.source_names)):
+        if len(codes) != len(store):
+            problems.append(f"{len(codes)} {column} codes for {len(store)} rows")
+        elif len(codes) and (codes.max() >= len(names) or codes.min() < (-1 if column == 'label' else 0)):
+            problems.append(f"{column} codes outside 0..{len(names) - 1}")
+    return problems
+
+
+def describe_store(store):
+    """Rows and labels per language and split"""
+    lines = []
+    for language in store.language_names:
+        for split in store.split_names:
+            view = store.view(language, split)
+            if len(view):
+                labelled = view.labelled()
+                lines.append(f"{language:>10} {split:>6}: {len(view):>7} rows, "
+                             f"{len(set(labelled.labels())):>3} labels, {len(view) - len(labelled)} unlabelled")
+    return lines
+
+
+def _write(path, header, sections):
+    header_len = 0
+    # Section offsets depend on the header length, as in model_artifact.save_model
+    while True:
+        offset = _align(PREAMBLE.size + header_len)
+        for name, array in sections.items():
+            header['sections'][name] = {
+                'dtype': array.dtype.newbyteorder('<').str,
+                'shape': list(array.shape),
+                'offset': offset,
+            }
+            offset = _align(offset + array.nbytes)
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) == header_len:
+            break
+        header_len = len(encoded)
+
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(encoded)
+        for name, array in sections.items():
+            f.write(b'\0' * (header['sections'][name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).tobytes())
+    os.replace(tmp_path, path)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert datasets/ text and label files into one memory-mapped columnar store, or check one. "
+                    "Training, evaluation and prediction scripts take the store as path[:language[:split]] "
+                    "wherever they take a data file.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="validate the source files and write a store")
+    build.add_argument('--output', default=DEFAULT_STORE)
+    build.add_argument('--pair', nargs=4, action='append', default=[],
+                       metavar=('LANGUAGE', 'SPLIT', 'DATA', 'LABELS'),
+                       help="a data file and its label file; may be repeated")
+    build.add_argument('--labelled', nargs=3, action='append', default=[], metavar=('LANGUAGE', 'SPLIT', 'FILE'),
+                       help="a file whose lines end with their label; may be repeated")
+    build.add_argument('--keep-header-rows', action='store_true',
+                       help="keep a first 'text aspect' / 'aspect' row as an example")
+    build.add_argument('--strip-label-suffix', action='store_true',
+                       help="remove the label from the end of texts that repeat it")
+    check = commands.add_parser('validate', help="check a store and print its rows per language and split")
+    check.add_argument('store', nargs='?', default=DEFAULT_STORE)
+    args = parser.parse_args()
+
+    if args.command == 'validate':
+        store = open_store(args.store)
+        problems = check_store(store)
+        for line in describe_store(store) if not problems else problems:
+            print(line)
+        raise SystemExit(1 if problems else 0)
+
+    sources = [tuple(pair) for pair in args.pair] + [(language, split, path, None)
+                                                      for language, split, path in args.labelled]
+    if not sources:
+        sources = ([(language, split, os.path.join(DATASETS_DIR, data), os.path.join(DATASETS_DIR, labels))
+                    for language, split, data, labels in DEFAULT_PAIRS]
+                   + [(language, split, os.path.join(DATASETS_DIR, path), None)
+                      for language, split, path in DEFAULT_LABELLED])
+    report = build_store(args.output, sources, not args.keep_header_rows, args.strip_label_suffix)
+    for name, issues in report.items():
+        for level, message in issues:
+            print(f"{level}: {name}: {message}")
+    if any(level == 'error' for issues in report.values() for level, _ in issues):
+        raise SystemExit("Not written: fix the errors above")
+    store = open_store(args.output)
+    print(f"Wrote {len(store)} rows to {args.output}")
+    for line in describe_store(store):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
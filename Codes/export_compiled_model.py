@@ -0,0 +1,30 @@
+import sys
+from sys import argv
+from pickle import load
+
+from compiled_model import CompiledModel
+from model_artifact import save_model
+
+
+def loadObjectFromFile(filePath):
+    with open(filePath, 'rb') as fileLoad:
+        return load(fileLoad)
+
+
+def main():
+    """Usage: export_compiled_model.py word-vect.pkl char-vect.pkl classifier.pkl compiled-model.bin"""
+    wordTfIdfVect = loadObjectFromFile(argv[1])
+    charTfIdfVect = loadObjectFromFile(argv[2])
+    classifier = loadObjectFromFile(argv[3])
+    try:
+        compiledModel = CompiledModel.from_sklearn([wordTfIdfVect, charTfIdfVect], classifier)
+    except ValueError as e:
+        # Models from train_streaming_hashed_TFIDF.py hash their n-grams and keep no vocabulary
+        print(f"Cannot export {argv[1]} and {argv[2]}: {e}")
+        sys.exit(1)
+    save_model(compiledModel, argv[4])
+    print(f"Compiled model with {sum(len(block.terms) for block in compiledModel.blocks)} n-grams saved to {argv[4]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""On-disk cache of fitted TF-IDF vectorizers and the matrices they produce.
+
+An entry is keyed by the content hash of the training lines, the hashes of
+any other line lists transformed with the vectorizer, and the vectorizer
+parameters (plus the scikit-learn version, since the vectorizer is pickled).
+Changing a data file or a parameter changes the key, so stale entries are
+never read. Each entry is a directory holding ``vectorizer.pkl`` and one
+uncompressed ``.npz`` per matrix, written to a temporary directory and
+renamed into place.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import sklearn
+from scipy.sparse import load_npz, save_npz
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def lines_hash(lines):
+    """Content hash of a list of lines"""
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def fit_transform(self, train_data, analyzer='word', ngram_range=(1, 1), transform_data=()):
+        """Return ``(vectorizer, train_matrix, [matrix for each of transform_data])``.
+
+        The vectorizer is ``TfidfVectorizer(analyzer, ngram_range)`` fitted on
+        ``train_data``, as in train_models_with_pandas_word_char_TFIDF.py.
+        """
+        params = {'analyzer': analyzer, 'ngram_range': list(ngram_range)}
+        key = self.key(params, train_data, transform_data)
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            self.hits += 1
+            return self._read(entry, len(transform_data))
+
+        self.misses += 1
+        vect = TfidfVectorizer(analyzer=analyzer, ngram_range=tuple(ngram_range))
+        matrices = [vect.fit_transform(train_data)] + [vect.transform(data) for data in transform_data]
+        self._write(entry, vect, matrices)
+        return vect, matrices[0], matrices[1:]
+
+    def key(self, params, train_data, transform_data=()):
+        material = {
+            'params': params,
+            'sklearn': sklearn.__version__,
+            'train': lines_hash(train_data),
+            'transform': [lines_hash(data) for data in transform_data],
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+    def _read(self, entry, n_transformed):
+        with open(os.path.join(entry, 'vectorizer.pkl'), 'rb') as f:
+            vect = pickle.load(f)
+        matrices = [load_npz(os.path.join(entry, f'matrix-{i}.npz')) for i in range(n_transformed + 1)]
+        return vect, matrices[0], matrices[1:]
+
+    def _write(self, entry, vect, matrices):
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with open(os.path.join(tmp_dir, 'vectorizer.pkl'), 'wb') as f:
+                pickle.dump(vect, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for i, matrix in enumerate(matrices):
+                save_npz(os.path.join(tmp_dir, f'matrix-{i}.npz'), matrix.tocsr(), compressed=False)
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # Another process stored the same entry first
+            if not os.path.isdir(entry):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,189 @@
+"""Versioned binary format for compiled models.
+
+Layout::
+
+    magic (8 bytes) | format version (u32) | header length (u32) | JSON header
+    | sections, each aligned to 64 bytes
+
+The JSON header holds the class labels, the intercept, each block's
+vectorizer config and the dtype/shape/offset of every section. Sections are
+raw little-endian arrays: per block the IDF and folded weights, the term
+string table (UTF-8 blob plus offsets) and, for char blocks, the alphabet
+and the n-gram hash table. Version 2 adds int8 weights with a float32 scale
+per class; files without them are still written as version 1. ``load_model``
+maps the file read-only, so every process serving the same file shares one
+page-cache copy and nothing is unpickled.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from compiled_model import CharNgramKeys, CompiledModel, FeatureBlock
+
+MAGIC = b'ASPMODL\0'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<8sII')
+
+
+class StringTable:
+    """Read-only list of strings stored as offsets into one UTF-8 buffer"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def encode(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        total = sum(len(b) for b in encoded)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32 if total < 2 ** 32 else np.uint64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[int(self.offsets[i]):int(self.offsets[i + 1])]).decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        text = bytes(self.blob)
+        bounds = self.offsets.tolist()
+        return [text[a:b].decode('utf-8') for a, b in zip(bounds, bounds[1:])]
+
+
+def quantize_int8(weights):
+    """Symmetric per-class int8 quantization: return ``(int8 weights, float32 scale per class)``"""
+    weights = np.asarray(weights, dtype=np.float64)
+    scales = np.abs(weights).max(axis=0, initial=0.0) / 127.0
+    scales[scales == 0.0] = 1.0
+    quantized = np.clip(np.rint(weights / scales), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def save_model(model, path, dtype=np.float32):
+    """Write ``model`` to ``path`` atomically, storing weights and IDF as ``dtype``.
+
+    ``dtype`` may also be float16, or int8 for weights quantized per class;
+    the IDF is then kept as float32.
+    """
+    dtype = np.dtype(dtype)
+    idf_dtype = dtype if dtype in (np.float32, np.float64) else np.dtype(np.float32)
+    sections = {}
+    blocks = []
+    for i, block in enumerate(model.blocks):
+        terms = block.terms if isinstance(block.terms, StringTable) else StringTable.encode(block.terms)
+        sections[f'idf_{i}'] = np.asarray(block.idf, dtype=idf_dtype)
+        if dtype == np.int8:
+            sections[f'weights_{i}'], sections[f'weight_scales_{i}'] = quantize_int8(block.dense_weights())
+        else:
+            sections[f'weights_{i}'] = np.asarray(block.dense_weights(), dtype=dtype)
+        sections[f'term_offsets_{i}'] = terms.offsets
+        sections[f'term_blob_{i}'] = terms.blob
+        if block.char_keys is not None:
+            sections[f'alphabet_{i}'] = block.char_keys.alphabet
+            sections[f'table_keys_{i}'] = block.char_keys.table_keys
+            sections[f'table_ids_{i}'] = block.char_keys.table_ids
+        blocks.append({'config': block.config, 'hashed': block.char_keys is not None, 'scaled': dtype == np.int8})
+
+    header = {
+        'classes': [str(c) for c in model.classes],
+        'intercept': [float(x) for x in model.intercept],
+        'blocks': blocks,
+        'sections': {},
+    }
+    # Identifies the model's content, so loading never has to read the whole file
+    digest = hashlib.sha256(json.dumps(header, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    for name, array in sections.items():
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).tobytes())
+    header['sha256'] = digest.hexdigest()
+    # Offsets depend on the header length, which depends on the offsets'
+    # digits, so lay the file out until the header size stops changing.
+    header_len = 0
+    while True:
+        offset = _align(PREAMBLE.size + header_len)
+        for name, array in sections.items():
+            header['sections'][name] = {
+                'dtype': array.dtype.newbyteorder('<').str,
+                'shape': list(array.shape),
+                'offset': offset,
+            }
+            offset = _align(offset + array.nbytes)
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) == header_len:
+            break
+        header_len = len(encoded)
+
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        # Files with int8 weights need a reader that applies the scales
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION if dtype == np.int8 else 1, header_len))
+        f.write(encoded)
+        for name, array in sections.items():
+            f.write(b'\0' * (header['sections'][name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<')).tobytes())
+    # Replace rather than overwrite so processes mapping the old file keep a valid view.
+    os.replace(tmp_path, path)
+
+
+def load_model(path):
+    """Map a compiled model file read-only and return a CompiledModel over it"""
+    buffer, header = _map_model(path)
+
+    def section(name):
+        spec = header['sections'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        if count == 0:
+            return np.empty(spec['shape'], dtype=dtype)
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=spec['offset']).reshape(spec['shape'])
+
+    blocks = []
+    for i, spec in enumerate(header['blocks']):
+        config = spec['config']
+        char_keys = None
+        if spec['hashed']:
+            char_keys = CharNgramKeys(section(f'alphabet_{i}'), config['ngram_range'],
+                                      section(f'table_keys_{i}'), section(f'table_ids_{i}'))
+        terms = StringTable(section(f'term_offsets_{i}'), section(f'term_blob_{i}'))
+        scales = section(f'weight_scales_{i}') if spec.get('scaled') else None
+        blocks.append(FeatureBlock(config, terms, section(f'idf_{i}'), section(f'weights_{i}'), char_keys, scales))
+    return CompiledModel(blocks, header['classes'], header['intercept'], _digest(buffer, header))
+
+
+def model_digest(path):
+    """SHA-256 content digest of a compiled model file, without loading the model"""
+    buffer, header = _map_model(path)
+    try:
+        return _digest(buffer, header)
+    finally:
+        buffer.close()
+
+
+def _map_model(path):
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compiled model file")
+    if version not in (1, FORMAT_VERSION):
+        raise ValueError(f"{path} has format version {version}, expected at most {FORMAT_VERSION}")
+    return buffer, json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+
+
+def _digest(buffer, header):
+    # Files written before the header carried a digest are hashed whole
+    return header.get('sha256') or hashlib.sha256(buffer).hexdigest()
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,294 @@
+"""Incremental updates of compiled models from a log of labelled feedback.
+
+Feedback is appended to a JSON-lines log, one ``{"language", "text",
+"label"}`` object per line. ``OnlineUpdater.run_once`` reads the entries
+added since its last run, continues training each affected language's
+compiled model with ``SGDClassifier.partial_fit`` and publishes the
+result. The feature space is the model's own frozen vocabulary and IDF
+(``CompiledModel.tfidf``), so only the weights change and no vectorizer
+is refitted.
+
+Models are served and updated from live copies outside the released
+model directory (``prepare_live_models``), so the shipped files never
+change; a live copy is reset when its released file is re-exported.
+Publishing writes ``versions/<name>.v<N>.bin`` next to the live model
+and then replaces the live file with a copy of it via ``os.replace``.
+Processes that have the old file mapped keep a valid view, and a
+ModelRegistry with a reload interval picks up the new file on its next
+check, so a server switches between requests without restarting. The log
+offset and version numbers are kept in ``<log>.state.json``; a crash
+before the state is saved only means the same entries are applied again.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from model_artifact import load_model, model_digest, save_model
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# Live models, their versions and the feedback log; untracked, delete it to go back to the released models
+RUNTIME_DIR = os.path.join(ROOT_DIR, 'runtime')
+
+
+def live_model_path(path, live_dir):
+    """Where the live copy of the released model ``path`` is kept in ``live_dir``"""
+    return os.path.join(live_dir, os.path.basename(path))
+
+
+def refresh_live_model(path, live_path):
+    """Reset ``live_path`` to the released model ``path`` if it is missing or was made from another release.
+
+    A live file starts as a hard link to the released file (a copy across
+    filesystems). Publishing replaces the live name only, so the released
+    file is left as it is. The digest of the release a live file was made
+    from is kept in ``<live>.released.json``; when a retrained model is
+    exported over the released file, its digest changes and the live file,
+    with any online updates applied to the old release, is replaced.
+    Returns whether the live file was replaced.
+    """
+    digest = model_digest(path)
+    record_path = f'{live_path}.released.json'
+    try:
+        with open(record_path, 'r', encoding='utf-8') as f:
+            current = json.load(f).get('sha256') == digest
+    except (OSError, ValueError):
+        current = False
+    if current and os.path.exists(live_path):
+        return False
+
+    os.makedirs(os.path.dirname(live_path), exist_ok=True)
+    # A release copied over in place is still the live file's inode; only the record is out of date
+    if not (os.path.exists(live_path) and os.path.samefile(path, live_path)):
+        tmp_path = f'{live_path}.tmp{os.getpid()}'
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, live_path)
+    with open(f'{record_path}.tmp{os.getpid()}', 'w', encoding='utf-8') as f:
+        json.dump({'released': os.path.abspath(path), 'sha256': digest}, f)
+    os.replace(f'{record_path}.tmp{os.getpid()}', record_path)
+    return True
+
+
+def prepare_live_models(model_paths, live_dir):
+    """Return ``{key: live path}`` for released models, refreshing their live files in ``live_dir``"""
+    live_paths = {}
+    for key, path in model_paths.items():
+        live_paths[key] = live_model_path(path, live_dir)
+        refresh_live_model(path, live_paths[key])
+    return live_paths
+
+
+class FeedbackLog:
+    """Append-only JSON-lines log of labelled lines, safe to share between threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entries):
+        """Append ``(language, text, label)`` tuples; return how many were written"""
+        lines = [json.dumps({'language': language, 'text': text, 'label': label}, ensure_ascii=False) + '\n'
+                 for language, text, label in entries]
+        with self._lock, open(self.path, 'a', encoding='utf-8') as log:
+            log.write(''.join(lines))
+        return len(lines)
+
+    def read_from(self, offset):
+        """Return the complete entries after byte ``offset`` and the offset they end at"""
+        if not os.path.exists(self.path):
+            return [], offset
+        with open(self.path, 'rb') as log:
+            log.seek(offset)
+            data = log.read()
+        # A line still being written has no newline yet; leave it for the next run
+        end = data.rfind(b'\n') + 1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries, offset + end
+
+
+class OnlineUpdater:
+    """Apply new feedback to compiled models and publish them as new versions.
+
+    ``model_paths`` maps a language code to its live compiled model file
+    (see ``prepare_live_models``), which is read and replaced in place.
+    ``on_publish(language, path, version)`` is called after a model file
+    is replaced, e.g. to drop it from a ModelRegistry straight away.
+    """
+
+    def __init__(self, log, model_paths, learning_rate=0.1, alpha=1e-6, epochs=3, min_examples=1,
+                 keep_versions=5, on_publish=None):
+        self.log = log
+        self.model_paths = dict(model_paths)
+        self.learning_rate = learning_rate
+        self.alpha = alpha
+        self.epochs = epochs
+        self.min_examples = min_examples
+        self.keep_versions = keep_versions
+        self.on_publish = on_publish
+        self.state_path = log.path + '.state.json'
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'applied': 0, 'skipped': 0, 'published': 0, 'last_update_seconds': 0.0}
+
+    def run_once(self):
+        """Apply every entry logged since the last run; return ``{language: version}`` published"""
+        with self._lock:
+            state = self._read_state()
+            entries, offset = self.log.read_from(state['offset'])
+            if len(entries) < self.min_examples:
+                return {}
+            by_language = {}
+            for entry in entries:
+                if entry.get('language') in self.model_paths and entry.get('text') and entry.get('label'):
+                    by_language.setdefault(entry['language'], []).append(entry)
+                else:
+                    self._stats['skipped'] += 1
+
+            published = {}
+            start = time.perf_counter()
+            for language, language_entries in by_language.items():
+                version = state['versions'].get(language, 0) + 1
+                if self._update(language, language_entries, version):
+                    state['versions'][language] = version
+                    published[language] = version
+            state['offset'] = offset
+            self._write_state(state)
+            self._stats['runs'] += 1
+            self._stats['published'] += len(published)
+            self._stats['last_update_seconds'] = time.perf_counter() - start
+
+        if self.on_publish is not None:
+            for language, version in published.items():
+                self.on_publish(language, self.model_paths[language], version)
+        return published
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['versions'] = dict(self._read_state()['versions'])
+            return snapshot
+
+    def _update(self, language, entries, version):
+        # Imported here so servers that never run an update do not load scikit-learn at startup
+        from sklearn.linear_model import SGDClassifier
+
+        path = self.model_paths[language]
+        model = load_model(path)
+        known = set(str(c) for c in model.classes)
+        usable = [e for e in entries if e['label'] in known]
+        # The label set is part of the frozen model; new aspects need a full retrain
+        self._stats['skipped'] += len(entries) - len(usable)
+        if not usable:
+            return False
+
+        features = model.tfidf([e['text'] for e in usable])
+        labels = np.asarray([e['label'] for e in usable])
+        clf = SGDClassifier(loss='hinge', learning_rate='constant', eta0=self.learning_rate, alpha=self.alpha)
+        # Start from the published weights: partial_fit keeps a coef_ that is already set
+        clf.coef_ = model.coef()
+        clf.intercept_ = np.asarray(model.intercept, dtype=np.float64).copy()
+        classes = np.asarray([str(c) for c in model.classes])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for _ in range(self.epochs):
+                clf.partial_fit(features, labels, classes=classes)
+        self._stats['applied'] += len(usable)
+
+        updated = model.with_coef(clf.coef_, clf.intercept_)
+        # Keep the storage type of the published model, e.g. float16 or int8 from compress_model.py
+        block = model.blocks[0]
+        self._publish(updated, path, version, np.int8 if block.scales is not None else block.weights.dtype)
+        return True
+
+    def _publish(self, model, path, version, dtype):
+        directory, name = os.path.split(path)
+        stem = os.path.splitext(name)[0]
+        versions_dir = os.path.join(directory, 'versions')
+        os.makedirs(versions_dir, exist_ok=True)
+        version_path = os.path.join(versions_dir, f'{stem}.v{version:04d}.bin')
+        save_model(model, version_path, dtype)
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        shutil.copyfile(version_path, tmp_path)
+        os.replace(tmp_path, path)
+
+        if self.keep_versions:
+            old = sorted(f for f in os.listdir(versions_dir) if f.startswith(stem + '.v') and f.endswith('.bin'))
+            for stale in old[:-self.keep_versions]:
+                os.remove(os.path.join(versions_dir, stale))
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'offset': 0, 'versions': {}}
+
+    def _write_state(self, state):
+        tmp_path = f'{self.state_path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+class BackgroundUpdater(threading.Thread):
+    """Call ``updater.run_once`` every ``interval`` seconds until stopped"""
+
+    def __init__(self, updater, interval):
+        super().__init__(name='online-updater', daemon=True)
+        self.updater = updater
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                published = self.updater.run_once()
+            except Exception as e:
+                print(f"Online update failed: {type(e).__name__}: {e}")
+                continue
+            for language, version in published.items():
+                print(f"Published {language} model version {version}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply the feedback logged since the last run to compiled models and publish new "
+                    "versions as live copies in --live-dir. A server using the same directory with "
+                    "MODEL_RELOAD_INTERVAL set swaps them in without a restart.")
+    parser.add_argument('feedbackLog')
+    parser.add_argument('models', nargs='+', metavar='LANGUAGE=MODEL',
+                        help="released models, e.g. hi=Model2/hindi-compiled-svm.bin; they are not modified")
+    parser.add_argument('--live-dir', default=os.path.join(RUNTIME_DIR, 'models'))
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument('--alpha', type=float, default=1e-6, help="L2 regularisation of the SGD updates")
+    parser.add_argument("--epochs", type=int, default=3, help="passes over the new feedback")
+    parser.add_argument('--keep-versions', type=int, default=5)
+    args = parser.parse_args()
+
+    model_paths = prepare_live_models(dict(spec.split('=', 1) for spec in args.models), args.live_dir)
+    updater = OnlineUpdater(FeedbackLog(args.feedbackLog), model_paths, learning_rate=args.learning_rate,
+                            alpha=args.alpha, epochs=args.epochs, keep_versions=args.keep_versions)
+    published = updater.run_once()
+    stats = updater.stats()
+    for language, version in published.items():
+        print(f"Published {language} version {version} to {model_paths[language]}")
+    print(f"Applied {stats['applied']} entries, skipped {stats['skipped']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import multiprocessing
+import time
+from collections import deque
+
+from model_artifact import load_model
+from predict_final_test_on_combined_TFIDF_pandas import (
+    loadObjectFromFile, predictOnBatch, readLineBatchesFromFile, writeBatchesToFile)
+
+# Set once per worker process by initWorker
+workerPredict = None
+
+
+def loadPredictor(modelFiles):
+    """Return a function predicting a batch with a compiled model or a classifier/word/char pickle triple"""
+    if len(modelFiles) == 1:
+        compiledModel = load_model(modelFiles[0])
+        return compiledModel.predict
+    if len(modelFiles) == 3:
+        classifier, wordTfIdfVect, charTfIdfVect = [loadObjectFromFile(f) for f in modelFiles]
+        return lambda batch: predictOnBatch(batch, classifier, wordTfIdfVect, charTfIdfVect)
+    raise ValueError("Give either one compiled model or classifier, word and char vectorizer pickles")
+
+
+def initWorker(modelFiles):
+    global workerPredict
+    workerPredict = loadPredictor(modelFiles)
+
+
+def predictBatchInWorker(batch):
+    return [str(p) for p in workerPredict(batch)]
+
+
+def orderedParallelMap(pool, batches, maxInFlight):
+    """Yield predictions for each batch in input order, keeping at most maxInFlight batches queued"""
+    inFlight = deque()
+    for batch in batches:
+        inFlight.append(pool.apply_async(predictBatchInWorker, (batch,)))
+        if len(inFlight) >= maxInFlight:
+            yield inFlight.popleft().get()
+    while inFlight:
+        yield inFlight.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Predict aspects for a large file on all cores. The model is loaded once per worker; "
+                    "compiled models are memory-mapped, so workers share one copy.")
+    parser.add_argument('testFile')
+    parser.add_argument('predFile')
+    parser.add_argument('modelFiles', nargs='+',
+                        help="compiled-model.bin, or classifier.pkl word-vect.pkl char-vect.pkl")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lineCount = 0
+
+    def countLines(predictions):
+        nonlocal lineCount
+        for batch in predictions:
+            lineCount += len(batch)
+            yield batch
+
+    batches = readLineBatchesFromFile(args.testFile, args.batch_size)
+    if args.workers <= 1:
+        predict = loadPredictor(args.modelFiles)
+        predictions = ([str(p) for p in predict(batch)] for batch in batches)
+        writeBatchesToFile(args.predFile, countLines(predictions))
+    else:
+        # fork lets workers inherit the imported modules; each maps or unpickles the model once
+        context = multiprocessing.get_context('fork')
+        with context.Pool(args.workers, initializer=initWorker, initargs=(args.modelFiles,)) as pool:
+            predictions = orderedParallelMap(pool, batches, maxInFlight=2 * args.workers)
+            writeBatchesToFile(args.predFile, countLines(predictions))
+
+    elapsed = time.perf_counter() - start
+    print(f"Predicted {lineCount} lines in {elapsed:.2f}s "
+          f"({lineCount / elapsed if elapsed else 0:.0f} lines/sec, {args.workers} workers)")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,10 @@ from sys import argv
 from scipy.sparse import hstack
 from sklearn.feature_extraction.text import TfidfVectorizer
 from pickle import load
+from dataset_store import read_spec
+from model_artifact import load_model
+
+BATCH_SIZE = 10000
 
 
 def createTFIDFVectorsFromTrainData(trainData, analyzer='word', ngram_range=(1, 1)):
@@ -33,21 +37,62 @@ def readLinesFromFile(filePath):
         return [line.strip() for line in fileRead.readlines() if line.strip()]
 
 
-def main():
-    testFile = argv[1]
-    classifier = loadObjectFromFile(argv[2])
-    wordTfIdfVect = loadObjectFromFile(argv[3])
-    charTfIdfVect = loadObjectFromFile(argv[4])
-    predFile = argv[5]
-    testData = readLinesFromFile(testFile)
+def readLineBatchesFromFile(filePath, batchSize=BATCH_SIZE):
+    """Yield the non-empty lines of a file, or the texts of a dataset store, in lists of at most batchSize"""
+    store = read_spec(filePath)
+    if store is not None:
+        for texts, _ in store.batches(batchSize):
+            yield texts
+        return
+    with open(filePath, 'r', encoding='utf-8') as fileRead:
+        batch = []
+        for line in fileRead:
+            line = line.strip()
+            if line:
+                batch.append(line)
+                if len(batch) == batchSize:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def writeBatchesToFile(filePath, batches):
+    """Write each batch as soon as it arrives, newline-separated like writeListToFile"""
+    with open(filePath, 'w', encoding='utf-8') as fileWrite:
+        separator = ''
+        for batch in batches:
+            if len(batch):
+                fileWrite.write(separator + '\n'.join(batch))
+                separator = '\n'
+
+
+def predictOnBatch(testData, classifier, wordTfIdfVect, charTfIdfVect):
     wordTestTfIdf = createTestTfIdf(
         testData, wordTfIdfVect)
     charTestTfIdf = createTestTfIdf(
         testData, charTfIdfVect)
     combinedTestTfIdf = hstack(
         [wordTestTfIdf, charTestTfIdf])
-    testPredictions = predictOnFeatures(classifier, combinedTestTfIdf)
-    writeListToFile(predFile, testPredictions)
+    return predictOnFeatures(classifier, combinedTestTfIdf)
+
+
+def main():
+    # Lines are read, vectorized, predicted and written BATCH_SIZE at a time,
+    # so memory stays bounded however large the test file is.
+    testFile = argv[1]
+    if len(argv) == 4:
+        # testFile compiled-model.bin predFile: folded weights, no TF-IDF matrices
+        compiledModel = load_model(argv[2])
+        writeBatchesToFile(argv[3], (compiledModel.predict(batch)
+                                     for batch in readLineBatchesFromFile(testFile)))
+        return
+    classifier = loadObjectFromFile(argv[2])
+    wordTfIdfVect = loadObjectFromFile(argv[3])
+    charTfIdfVect = loadObjectFromFile(argv[4])
+    predFile = argv[5]
+    writeBatchesToFile(predFile, (predictOnBatch(batch, classifier, wordTfIdfVect, charTfIdfVect)
+                                  for batch in readLineBatchesFromFile(testFile)))
 
 
 if __name__ == '__main__':
@@ -10,6 +10,9 @@ from sklearn.naive_bayes import MultinomialNB
 from sklearn.ensemble import GradientBoostingClassifier
 from random import shuffle
 
+from dataset_store import read_examples
+from feature_cache import FeatureCache
+
 
 def readLinesFromFile(filePath):
     with open(filePath, 'r', encoding='utf-8') as fileRead:
@@ -70,17 +73,31 @@ def main():
     char_ngram_range = (2, 5)
     word_analyzer = 'word'
     word_ngram_range = (1, 1)
-    trainData = readLinesFromFile(dataFilePath)
-    trainLabels = readLinesFromFile(labelFilePath)
+    # A dataset store (path:language:split) holds the labels too; pass - as the label file
+    examples = read_examples(dataFilePath)
+    if examples is not None:
+        trainData, trainLabels = examples
+    else:
+        trainData = readLinesFromFile(dataFilePath)
+        trainLabels = readLinesFromFile(labelFilePath)
     indexes = list(range(len(trainLabels)))
     assert len(trainLabels) == len(trainData)
     shuffle(indexes)
-    trainData = [trainData[i] for i in indexes]
-    trainLabels = [trainLabels[i] for i in indexes]
-    wordTrainTFIdf, wordTfIdfVect = createTFIDFVectorsFromTrainData(
-        trainData, word_analyzer, word_ngram_range)
-    charTrainTFIdf, charTfIdfVect = createTFIDFVectorsFromTrainData(
-        trainData, char_analyzer, char_ngram_range)
+    if len(argv) > 4:
+        # Vectorize in file order so the cache key stays stable, then shuffle the rows
+        featureCache = FeatureCache(argv[4])
+        wordTfIdfVect, wordTrainTFIdf, _ = featureCache.fit_transform(trainData, word_analyzer, word_ngram_range)
+        charTfIdfVect, charTrainTFIdf, _ = featureCache.fit_transform(trainData, char_analyzer, char_ngram_range)
+        wordTrainTFIdf = wordTrainTFIdf[indexes]
+        charTrainTFIdf = charTrainTFIdf[indexes]
+        trainLabels = [trainLabels[i] for i in indexes]
+    else:
+        trainData = [trainData[i] for i in indexes]
+        trainLabels = [trainLabels[i] for i in indexes]
+        wordTrainTFIdf, wordTfIdfVect = createTFIDFVectorsFromTrainData(
+            trainData, word_analyzer, word_ngram_range)
+        charTrainTFIdf, charTfIdfVect = createTFIDFVectorsFromTrainData(
+            trainData, char_analyzer, char_ngram_range)
     combinedTrainTfIdf = hstack([wordTrainTFIdf, charTrainTFIdf])
     if re.search('svm', classifier, re.I):
         classifierToSelect = SVMClassifier(combinedTrainTfIdf, trainLabels)
@@ -0,0 +1,177 @@
+import argparse
+import os
+import random
+import re
+import time
+
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import make_pipeline
+
+from dataset_store import read_spec
+from train_models_with_pandas_word_char_TFIDF import dumpObjectIntoFile
+
+
+def readNonEmptyLines(filePath):
+    with open(filePath, 'r', encoding='utf-8') as fileRead:
+        for line in fileRead:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def readTrainBatchesFromFiles(dataFilePath, labelFilePath, batchSize):
+    """Yield (lines, labels) batches from the data and label files, or a dataset store, without reading either whole"""
+    store = read_spec(dataFilePath)
+    if store is not None:
+        yield from store.labelled().batches(batchSize)
+        return
+    dataLines = readNonEmptyLines(dataFilePath)
+    labelLines = readNonEmptyLines(labelFilePath)
+    batchData, batchLabels = [], []
+    for line in dataLines:
+        label = next(labelLines, None)
+        assert label is not None, "more data lines than labels"
+        batchData.append(line)
+        batchLabels.append(label)
+        if len(batchData) == batchSize:
+            yield batchData, batchLabels
+            batchData, batchLabels = [], []
+    assert next(labelLines, None) is None, "more labels than data lines"
+    if batchData:
+        yield batchData, batchLabels
+
+
+def shuffleBatches(batches, batchSize, bufferSize):
+    """Shuffle a stream of batches through a buffer of bufferSize examples"""
+    buffer = []
+
+    def drain(keep):
+        random.shuffle(buffer)
+        while len(buffer) - keep >= batchSize or (not keep and buffer):
+            chunk, buffer[:batchSize] = buffer[:batchSize], []
+            yield [line for line, _ in chunk], [label for _, label in chunk]
+
+    for batchData, batchLabels in batches:
+        buffer.extend(zip(batchData, batchLabels))
+        if len(buffer) >= bufferSize:
+            yield from drain(keep=bufferSize // 2)
+    yield from drain(keep=0)
+
+
+def createHashingVectorizer(analyzer, ngram_range, nFeatures, binary=False):
+    # Non-negative counts, normalised after IDF weighting like TfidfVectorizer
+    return HashingVectorizer(analyzer=analyzer, ngram_range=ngram_range, n_features=nFeatures,
+                             alternate_sign=False, norm=None, binary=binary)
+
+
+def computeStreamingIDF(batches, featureSpecs):
+    """One pass over the data: document frequencies of every hashed feature space and the label set"""
+    binaryVects = [createHashingVectorizer(analyzer, ngram_range, nFeatures, binary=True)
+                   for analyzer, ngram_range, nFeatures in featureSpecs]
+    docFreqs = [np.zeros(nFeatures, dtype=np.int64) for _, _, nFeatures in featureSpecs]
+    classes = set()
+    nDocs = 0
+    for batchData, batchLabels in batches:
+        for vect, docFreq in zip(binaryVects, docFreqs):
+            docFreq += np.bincount(vect.transform(batchData).indices, minlength=len(docFreq))
+        classes.update(batchLabels)
+        nDocs += len(batchData)
+    # Same smoothed IDF as TfidfVectorizer(smooth_idf=True)
+    idfs = [np.log((1 + nDocs) / (1 + docFreq)) + 1 for docFreq in docFreqs]
+    return idfs, sorted(classes), nDocs
+
+
+def createHashedTFIDFVectorizer(analyzer, ngram_range, nFeatures, idf):
+    """HashingVectorizer followed by a TfidfTransformer holding the streamed IDF.
+
+    The pipeline has the same transform() as a TfidfVectorizer, so the
+    prediction scripts load and apply it unchanged.
+    """
+    tfIdfTransformer = TfidfTransformer()
+    tfIdfTransformer.idf_ = idf
+    tfIdfTransformer.n_features_in_ = nFeatures
+    return make_pipeline(createHashingVectorizer(analyzer, ngram_range, nFeatures), tfIdfTransformer)
+
+
+def createStreamingClassifier(classifier):
+    if re.search('svm', classifier, re.I):
+        return SGDClassifier(loss='hinge', alpha=1e-5)
+    if re.search('logistic', classifier, re.I):
+        return SGDClassifier(loss='log_loss', alpha=1e-5)
+    if re.search('multi-nb', classifier, re.I):
+        return MultinomialNB(alpha=0.1)
+    if re.search('sgd', classifier, re.I):
+        return SGDClassifier(loss='perceptron')
+    raise ValueError(f"{classifier} cannot be trained incrementally; use svm, logistic, multi-nb or sgd")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train word+char TF-IDF models on corpora too large for memory. Features are hashed into "
+                    "fixed-size spaces, IDF comes from one streaming pass, and the classifier is fitted with "
+                    "partial_fit on mini-batches. The outputs load like the pickles of "
+                    "train_models_with_pandas_word_char_TFIDF.py.")
+    parser.add_argument('dataFile', help="a text file, or a dataset store as path[:language[:split]]")
+    parser.add_argument('labelFile', help="the labels of dataFile; - for a dataset store")
+    parser.add_argument('classifier', help="svm (hinge SGD), logistic (log-loss SGD), multi-nb or sgd (perceptron)")
+    parser.add_argument('--word-features', type=int, default=2 ** 18)
+    parser.add_argument('--char-features', type=int, default=2 ** 20)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--shuffle-buffer', type=int, default=100000,
+                        help="examples held in memory for shuffling between mini-batches")
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--output-dir', default='.')
+    args = parser.parse_args()
+
+    char_analyzer = 'char'
+    char_ngram_range = (2, 5)
+    word_analyzer = 'word'
+    word_ngram_range = (1, 1)
+    featureSpecs = [(word_analyzer, word_ngram_range, args.word_features),
+                    (char_analyzer, char_ngram_range, args.char_features)]
+
+    start = time.perf_counter()
+    idfs, classes, nDocs = computeStreamingIDF(
+        readTrainBatchesFromFiles(args.dataFile, args.labelFile, args.batch_size), featureSpecs)
+    print(f"IDF pass: {nDocs} lines, {len(classes)} labels in {time.perf_counter() - start:.1f}s")
+
+    wordTfIdfVect, charTfIdfVect = [createHashedTFIDFVectorizer(analyzer, ngram_range, nFeatures, idf)
+                                    for (analyzer, ngram_range, nFeatures), idf in zip(featureSpecs, idfs)]
+    classifierToSelect = createStreamingClassifier(args.classifier)
+    store = read_spec(args.dataFile)
+    for epoch in range(args.epochs):
+        epochStart = time.perf_counter()
+        if store is not None:
+            # A store is shuffled whole by permuting its row numbers, with no buffer
+            batches = store.labelled().shuffled(epoch).batches(args.batch_size)
+        else:
+            batches = shuffleBatches(readTrainBatchesFromFiles(args.dataFile, args.labelFile, args.batch_size),
+                                     args.batch_size, args.shuffle_buffer)
+        for batchData, batchLabels in batches:
+            combinedTfIdf = hstack([wordTfIdfVect.transform(batchData),
+                                    charTfIdfVect.transform(batchData)]).tocsr()
+            classifierToSelect.partial_fit(combinedTfIdf, batchLabels, classes=classes)
+        elapsed = time.perf_counter() - epochStart
+        print(f"Epoch {epoch + 1}/{args.epochs}: {nDocs / elapsed if elapsed else 0:.0f} lines/sec")
+
+    def outputPath(name):
+        return os.path.join(args.output_dir, name)
+
+    dumpObjectIntoFile(outputPath('train-vect-hashed-' + word_analyzer + '-' +
+                                  '-'.join(map(str, word_ngram_range)) + '-' + args.classifier + '.pkl'),
+                       wordTfIdfVect)
+    dumpObjectIntoFile(outputPath('train-vect-hashed-' + char_analyzer + '-' +
+                                  '-'.join(map(str, char_ngram_range)) + '-' + args.classifier + '.pkl'),
+                       charTfIdfVect)
+    dumpObjectIntoFile(outputPath(args.classifier + '-' + word_analyzer + '-' +
+                                  '-'.join(map(str, word_ngram_range)) + '-' + char_analyzer + '-' +
+                                  '-'.join(map(str, char_ngram_range)) + '-hashed.pkl'), classifierToSelect)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+from scipy.sparse import hstack
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.svm import LinearSVC
+
+from compiled_model import CompiledModel
+from dataset_store import read_examples
+from feature_cache import FeatureCache
+from model_artifact import save_model
+from train_models_with_pandas_word_char_TFIDF import (
+    createTFIDFVectorsFromTrainData, dumpObjectIntoFile, readLinesFromFile)
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'datasets'))
+
+# Training data and labels of each language bundle in Model2/
+LANGUAGE_DATASETS = {
+    'hindi': ('training-data.txt', 'hindi-labels.txt'),
+    'marathi': ('training-data-marathi.txt', 'marathi-labels.txt'),
+    'telugu': ('training-data-telugu.txt', 'telugu-labels.txt'),
+}
+
+# Classifiers taking a regularisation strength; the others are fitted once per feature set
+CLASSIFIERS_WITH_C = ('svm', 'logistic')
+
+# Vectorized splits, filled in the parent before the fit pool forks so workers share them
+sharedFeatures = {}
+
+
+def parseNgramRange(text):
+    low, high = text.split('-')
+    return int(low), int(high)
+
+
+def createClassifier(classifier, C):
+    if classifier == 'svm':
+        return LinearSVC(C=C)
+    if classifier == 'logistic':
+        return LogisticRegression(C=C, max_iter=1000)
+    if classifier == 'multi-nb':
+        return MultinomialNB(alpha=0.1)
+    if classifier == 'sgd':
+        return SGDClassifier(loss='perceptron')
+    raise ValueError(f"Unknown classifier {classifier}")
+
+
+def splitLanguage(language, testSize, seed, store=None):
+    if store:
+        data, labels = read_examples(f'{store}:{language}:train')
+    else:
+        dataFile, labelFile = LANGUAGE_DATASETS[language]
+        data = readLinesFromFile(os.path.join(DATASETS_DIR, dataFile))
+        labels = readLinesFromFile(os.path.join(DATASETS_DIR, labelFile))
+    assert len(data) == len(labels)
+    try:
+        return train_test_split(data, labels, test_size=testSize, random_state=seed, stratify=labels)
+    except ValueError:
+        # Labels seen only once cannot be stratified
+        return train_test_split(data, labels, test_size=testSize, random_state=seed)
+
+
+def vectorizeSplit(task):
+    """Fit one vectorizer on a language's training split and transform both splits"""
+    language, analyzer, ngramRange, trainData, testData, cacheDir = task
+    if cacheDir:
+        tfIdfVect, trainTfIdf, (testTfIdf,) = FeatureCache(cacheDir).fit_transform(
+            trainData, analyzer, ngramRange, transform_data=[testData])
+    else:
+        trainTfIdf, tfIdfVect = createTFIDFVectorsFromTrainData(trainData, analyzer, ngramRange)
+        testTfIdf = tfIdfVect.transform(testData)
+    return (language, analyzer, ngramRange), (tfIdfVect, trainTfIdf, testTfIdf)
+
+
+def fitConfiguration(config):
+    """Fit one grid point on the shared features and score it on the held-out split"""
+    language, classifier, wordRange, charRange, C = config
+    wordVect, wordTrain, wordTest = sharedFeatures[(language, 'word', wordRange)]
+    charVect, charTrain, charTest = sharedFeatures[(language, 'char', charRange)]
+    trainLabels, testLabels = sharedFeatures[(language, 'labels')]
+    start = time.perf_counter()
+    clf = createClassifier(classifier, C)
+    clf.fit(hstack([wordTrain, charTrain]).tocsr(), trainLabels)
+    fitSeconds = time.perf_counter() - start
+    accuracy = accuracy_score(testLabels, clf.predict(hstack([wordTest, charTest]).tocsr()))
+    return config, clf, fitSeconds, accuracy
+
+
+def writeBundle(outputDir, language, classifier, wordVect, charVect, clf):
+    """Write the pickles in Model2/ naming and, for linear classifiers, a compiled model"""
+    dumpObjectIntoFile(os.path.join(outputDir, f'{language}-train-vect-word-{classifier}.pkl'), wordVect)
+    dumpObjectIntoFile(os.path.join(outputDir, f'{language}-train-vect-char-{classifier}.pkl'), charVect)
+    dumpObjectIntoFile(os.path.join(outputDir, f'{language}-classifier-{classifier}.pkl'), clf)
+    if hasattr(clf, 'coef_'):
+        save_model(CompiledModel.from_sklearn([wordVect, charVect], clf),
+                   os.path.join(outputDir, f'{language}-compiled-{classifier}.bin'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep languages x classifiers x n-gram ranges x C. Each distinct vectorization is fitted "
+                    "once per language, classifier fits run on a process pool, and the most accurate "
+                    "configuration per language is written out.")
+    parser.add_argument('--languages', nargs='+', default=list(LANGUAGE_DATASETS), choices=list(LANGUAGE_DATASETS))
+    parser.add_argument('--classifiers', nargs='+', default=['svm', 'logistic', 'multi-nb', 'sgd'],
+                        choices=['svm', 'logistic', 'multi-nb', 'sgd'])
+    parser.add_argument('--word-ngrams', nargs='+', default=['1-1'], help="e.g. 1-1 1-2")
+    parser.add_argument('--char-ngrams', nargs='+', default=['2-5'], help="e.g. 2-4 2-5")
+    parser.add_argument('--C', nargs='+', type=float, default=[1.0], dest='cValues')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output-dir', default='sweep-output')
+    parser.add_argument('--cache-dir', help="reuse vectorizers and TF-IDF matrices across runs (see feature_cache.py)")
+    parser.add_argument('--store', help="read each language's train split from this dataset store (see dataset_store.py)")
+    args = parser.parse_args()
+
+    wordRanges = [parseNgramRange(r) for r in args.word_ngrams]
+    charRanges = [parseNgramRange(r) for r in args.char_ngrams]
+    os.makedirs(args.output_dir, exist_ok=True)
+    context = multiprocessing.get_context('fork')
+    sweepStart = time.perf_counter()
+
+    vectorizeTasks = []
+    for language in args.languages:
+        trainData, testData, trainLabels, testLabels = splitLanguage(language, args.test_size, args.seed, args.store)
+        sharedFeatures[(language, 'labels')] = (trainLabels, testLabels)
+        vectorizeTasks += [(language, 'word', r, trainData, testData, args.cache_dir) for r in wordRanges]
+        vectorizeTasks += [(language, 'char', r, trainData, testData, args.cache_dir) for r in charRanges]
+    with context.Pool(min(args.workers, len(vectorizeTasks))) as pool:
+        sharedFeatures.update(pool.map(vectorizeSplit, vectorizeTasks))
+    vectorizeSeconds = time.perf_counter() - sweepStart
+    print(f"Vectorized {len(vectorizeTasks)} feature sets in {vectorizeSeconds:.1f}s")
+
+    configs = []
+    for language, classifier, wordRange, charRange in itertools.product(
+            args.languages, args.classifiers, wordRanges, charRanges):
+        for C in (args.cValues if classifier in CLASSIFIERS_WITH_C else [None]):
+            configs.append((language, classifier, wordRange, charRange, C))
+
+    results = []
+    best = {}
+    # Forked after the features exist, so each worker reads them without copying through pickles
+    with context.Pool(min(args.workers, len(configs))) as pool:
+        for config, clf, fitSeconds, accuracy in pool.imap_unordered(fitConfiguration, configs):
+            language, classifier, wordRange, charRange, C = config
+            print(f"{language:8} {classifier:9} word {wordRange} char {charRange} C={C}: "
+                  f"accuracy {accuracy:.4f}, fit {fitSeconds:.2f}s")
+            results.append({'language': language, 'classifier': classifier, 'word_ngram_range': wordRange,
+                            'char_ngram_range': charRange, 'C': C, 'fit_seconds': fitSeconds,
+                            'accuracy': accuracy})
+            # Ties go to the faster fit
+            if language not in best or (accuracy, -fitSeconds) > (best[language][3], -best[language][2]):
+                best[language] = (config, clf, fitSeconds, accuracy)
+
+    wallSeconds = time.perf_counter() - sweepStart
+    slowestFit = max(r['fit_seconds'] for r in results)
+    print(f"{len(configs)} fits in {wallSeconds:.1f}s wall "
+          f"(slowest fit {slowestFit:.1f}s, sum of fits {sum(r['fit_seconds'] for r in results):.1f}s)")
+
+    winners = {}
+    for language, (config, clf, fitSeconds, accuracy) in best.items():
+        _, classifier, wordRange, charRange, C = config
+        wordVect = sharedFeatures[(language, 'word', wordRange)][0]
+        charVect = sharedFeatures[(language, 'char', charRange)][0]
+        writeBundle(args.output_dir, language, classifier, wordVect, charVect, clf)
+        winners[language] = {'classifier': classifier, 'word_ngram_range': wordRange,
+                             'char_ngram_range': charRange, 'C': C, 'accuracy': accuracy}
+        print(f"Best {language}: {classifier} word {wordRange} char {charRange} C={C} ({accuracy:.4f})")
+
+    with open(os.path.join(args.output_dir, 'sweep-report.json'), 'w', encoding='utf-8') as reportFile:
+        json.dump({'wall_seconds': wallSeconds, 'vectorize_seconds': vectorizeSeconds,
+                   'results': sorted(results, key=lambda r: (r['language'], -r['accuracy'])),
+                   'winners': winners}, reportFile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
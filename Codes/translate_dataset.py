@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import time
+
+# Sentences in a checkpoint are written as one JSON object per line
+CHECKPOINT_SUFFIX = '.checkpoint.jsonl'
+
+
+def readLinesFromFile(filePath):
+    with open(filePath, 'r', encoding='utf-8') as fileRead:
+        return [line.strip() for line in fileRead.readlines() if line.strip()]
+
+
+def loadCheckpoint(checkpointPath):
+    """Translations finished by an earlier run, keyed by source sentence"""
+    done = {}
+    if not os.path.exists(checkpointPath):
+        return done
+    with open(checkpointPath, 'r', encoding='utf-8') as checkpoint:
+        for line in checkpoint:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line may be cut short by a crash
+                continue
+            done[entry['source']] = entry['translation']
+    return done
+
+
+def tokenBudgetBatches(lengths, maxTokens, maxBatchSize):
+    """Group sentence indexes into batches whose padded size stays within maxTokens.
+
+    Sentences are sorted by token length so each batch pads to a similar
+    length; a batch costs its longest sentence times its size.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batch = []
+    longest = 0
+    for i in order:
+        candidate = max(longest, lengths[i])
+        if batch and (candidate * (len(batch) + 1) > maxTokens or len(batch) == maxBatchSize):
+            yield batch
+            batch, candidate = [], lengths[i]
+        batch.append(i)
+        longest = candidate
+    if batch:
+        yield batch
+
+
+def translateSentences(sentences, translateBatch, countTokens, checkpointPath,
+                       maxTokens=4096, maxBatchSize=64, progressEvery=10):
+    """Translate every distinct sentence once and return a source -> translation dict.
+
+    ``translateBatch(list of str)`` returns the translations of a batch and
+    ``countTokens(list of str)`` their token lengths. Each finished batch is
+    appended to ``checkpointPath``; sentences already in it are skipped, so
+    an interrupted run resumes where it stopped.
+    """
+    translations = loadCheckpoint(checkpointPath)
+    pending = [s for s in dict.fromkeys(sentences) if s not in translations]
+    print(f"{len(sentences)} sentences, {len(set(sentences))} distinct, "
+          f"{len(translations)} already in {checkpointPath}, {len(pending)} to translate")
+    if not pending:
+        return translations
+
+    lengths = countTokens(pending)
+    batches = list(tokenBudgetBatches(lengths, maxTokens, maxBatchSize))
+    start = time.perf_counter()
+    translated = 0
+    with open(checkpointPath, 'a', encoding='utf-8') as checkpoint:
+        for number, batch in enumerate(batches, 1):
+            sources = [pending[i] for i in batch]
+            for source, translation in zip(sources, translateBatch(sources)):
+                translations[source] = translation
+                checkpoint.write(json.dumps({'source': source, 'translation': translation},
+                                            ensure_ascii=False) + '\n')
+            checkpoint.flush()
+            translated += len(sources)
+            if number % progressEvery == 0 or number == len(batches):
+                elapsed = time.perf_counter() - start
+                print(f"Batch {number}/{len(batches)}: {translated}/{len(pending)} sentences, "
+                      f"{translated / elapsed if elapsed else 0:.1f} sentences/sec")
+    return translations
+
+
+def loadSeq2SeqTranslator(modelPath, srcLang, tgtLang, numBeams, maxLength, device, indicProcessing):
+    """Return (translateBatch, countTokens) for a locally stored Hugging Face seq2seq model.
+
+    With indicProcessing, IndicTransToolkit's IndicProcessor adds the
+    language tags IndicTrans2 expects and restores its output.
+    """
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(modelPath, trust_remote_code=True, local_files_only=True)
+    model = AutoModelForSeq2SeqLM.from_pretrained(modelPath, trust_remote_code=True, local_files_only=True)
+    model.to(device).eval()
+
+    processor = None
+    if indicProcessing:
+        from IndicTransToolkit import IndicProcessor
+        processor = IndicProcessor(inference=True)
+
+    def preprocess(sentences):
+        if processor is None:
+            return sentences
+        return processor.preprocess_batch(sentences, src_lang=srcLang, tgt_lang=tgtLang)
+
+    def countTokens(sentences):
+        encoded = tokenizer(preprocess(sentences), truncation=True, max_length=maxLength)
+        return [len(ids) for ids in encoded['input_ids']]
+
+    def translateBatch(sentences):
+        inputs = tokenizer(preprocess(sentences), truncation=True, max_length=maxLength, padding='longest',
+                           return_tensors='pt', return_attention_mask=True).to(device)
+        with torch.inference_mode():
+            generated = model.generate(**inputs, use_cache=True, min_length=0, max_length=maxLength,
+                                       num_beams=numBeams, do_sample=False, num_return_sequences=1)
+        decoded = tokenizer.batch_decode(generated.cpu().tolist(), skip_special_tokens=True,
+                                         clean_up_tokenization_spaces=True)
+        if processor is not None:
+            decoded = processor.postprocess_batch(decoded, lang=tgtLang)
+        return decoded
+
+    return translateBatch, countTokens
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translate a dataset line by line with a local seq2seq model (e.g. IndicTrans2), as used "
+                    "to build training-data-marathi.txt and training-data-telugu.txt. Sentences are deduplicated, "
+                    "sorted by length and batched up to a token budget; progress is checkpointed so a rerun "
+                    "resumes.")
+    parser.add_argument('inputFile')
+    parser.add_argument('outputFile')
+    parser.add_argument('modelPath', help="directory of a locally stored seq2seq model and tokenizer")
+    parser.add_argument('--src-lang', default='hin_Deva')
+    parser.add_argument('--tgt-lang', default='mar_Deva', help="e.g. mar_Deva or tel_Telu")
+    parser.add_argument('--indic', action='store_true',
+                        help="pre/postprocess with IndicTransToolkit, as IndicTrans2 models need")
+    parser.add_argument('--num-beams', type=int, default=1, help="1 decodes greedily; the notebook used 5")
+    parser.add_argument('--max-tokens', type=int, default=4096, help="padded source tokens per batch")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-length', type=int, default=256)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--threads', type=int, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    sentences = readLinesFromFile(args.inputFile)
+    checkpointPath = args.outputFile + CHECKPOINT_SUFFIX
+    translateBatch, countTokens = loadSeq2SeqTranslator(
+        args.modelPath, args.src_lang, args.tgt_lang, args.num_beams, args.max_length, args.device, args.indic)
+
+    start = time.perf_counter()
+    translations = translateSentences(sentences, translateBatch, countTokens, checkpointPath,
+                                      maxTokens=args.max_tokens, maxBatchSize=args.max_batch_size)
+    elapsed = time.perf_counter() - start
+
+    tmpPath = f'{args.outputFile}.tmp{os.getpid()}'
+    with open(tmpPath, 'w', encoding='utf-8') as outputFile:
+        for sentence in sentences:
+            outputFile.write(translations[sentence] + '\n')
+    os.replace(tmpPath, args.outputFile)
+    os.remove(checkpointPath)
+    print(f"Translated {len(sentences)} sentences in {elapsed:.1f}s "
+          f"({len(sentences) / elapsed if elapsed else 0:.1f} sentences/sec) to {args.outputFile}")
+
+
+if __name__ == '__main__':
+    main()
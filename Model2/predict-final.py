@@ -1,11 +1,36 @@
 from scipy.sparse import hstack
 from sklearn.feature_extraction.text import TfidfVectorizer
 from pickle import load
+import os
+import sys
+
+# dataset_store.py lives in Codes/; upload it next to this script when running elsewhere
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Codes'))
+from dataset_store import read_spec
 
 def readLinesFromFile(filePath):
     with open(filePath, 'r', encoding='utf-8') as fileRead:
         return [line.strip() for line in fileRead.readlines() if line.strip()]
 
+def readLineBatchesFromFile(filePath, batchSize):
+    # A dataset store spec, e.g. 'aspects.aspds:telugu:test', is read column-wise instead
+    store = read_spec(filePath)
+    if store is not None:
+        for texts, _ in store.batches(batchSize):
+            yield texts
+        return
+    with open(filePath, 'r', encoding='utf-8') as fileRead:
+        batch = []
+        for line in fileRead:
+            line = line.strip()
+            if line:
+                batch.append(line)
+                if len(batch) == batchSize:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
 def createTestTfIdf(testData, tfIdfVect):
     return tfIdfVect.transform(testData)
 
@@ -27,18 +52,23 @@ charVectPath = '/kaggle/working/train-vect-char-svm.pkl'
 classifierPath = '/kaggle/working/classifier-svm.pkl'
 outputPredPath = '/kaggle/working/test-predictions-telugu-2.txt'
 
+batchSize = 10000  # lines vectorized and predicted at a time
+
 # 🔄 Prediction steps
-testData = readLinesFromFile(testFilePath)
 wordVect = loadObjectFromFile(wordVectPath)
 charVect = loadObjectFromFile(charVectPath)
 clf = loadObjectFromFile(classifierPath)
 
-wordTestTfIdf = createTestTfIdf(testData, wordVect)
-charTestTfIdf = createTestTfIdf(testData, charVect)
-combinedTestTfIdf = hstack([wordTestTfIdf, charTestTfIdf])
-
-predictions = predictOnFeatures(clf, combinedTestTfIdf)
+# Stream the test file so memory stays bounded for any input size
+with open(outputPredPath, 'w', encoding='utf-8') as fileWrite:
+    separator = ''
+    for testData in readLineBatchesFromFile(testFilePath, batchSize):
+        wordTestTfIdf = createTestTfIdf(testData, wordVect)
+        charTestTfIdf = createTestTfIdf(testData, charVect)
+        combinedTestTfIdf = hstack([wordTestTfIdf, charTestTfIdf])
 
-writeListToFile(outputPredPath, predictions)
+        predictions = predictOnFeatures(clf, combinedTestTfIdf)
+        fileWrite.write(separator + '\n'.join(predictions))
+        separator = '\n'
 
 print("✅ Predictions saved to:", outputPredPath)
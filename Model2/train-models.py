@@ -7,6 +7,13 @@ import re
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.ensemble import GradientBoostingClassifier
 from random import shuffle
+import os
+import sys
+
+# dataset_store.py and feature_cache.py live in Codes/; upload them next to this script when running elsewhere
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Codes'))
+from dataset_store import read_examples
+from feature_cache import FeatureCache
 
 
 def readLinesFromFile(filePath):
@@ -60,24 +67,39 @@ def main():
     dataFilePath = '/kaggle/input/combine-datasets/Combine-training-data.txt'
     labelFilePath = '/kaggle/working/Combine-training-data-labels.txt'
     classifier = 'svm'  # 👈 You can change this to 'logistic', 'multi-nb', 'sgd', etc.
+    # Set to e.g. '/kaggle/working/feature-cache' to reuse the TF-IDF features of unchanged data across runs
+    cacheDir = None
 
     char_analyzer = 'char'
     char_ngram_range = (2, 5)
     word_analyzer = 'word'
     word_ngram_range = (1, 1)
 
-    trainData = readLinesFromFile(dataFilePath)
-    trainLabels = readLinesFromFile(labelFilePath)
+    # dataFilePath may also be a dataset store, e.g. 'aspects.aspds:hindi:train', which holds the labels too
+    examples = read_examples(dataFilePath)
+    if examples is not None:
+        trainData, trainLabels = examples
+    else:
+        trainData = readLinesFromFile(dataFilePath)
+        trainLabels = readLinesFromFile(labelFilePath)
 
     assert len(trainLabels) == len(trainData)
 
     indexes = list(range(len(trainLabels)))
     shuffle(indexes)
-    trainData = [trainData[i] for i in indexes]
-    trainLabels = [trainLabels[i] for i in indexes]
-
-    wordTrainTFIdf, wordTfIdfVect = createTFIDFVectorsFromTrainData(trainData, word_analyzer, word_ngram_range)
-    charTrainTFIdf, charTfIdfVect = createTFIDFVectorsFromTrainData(trainData, char_analyzer, char_ngram_range)
+    if cacheDir:
+        # Vectorize in file order so the cache key stays stable, then shuffle the rows
+        featureCache = FeatureCache(cacheDir)
+        wordTfIdfVect, wordTrainTFIdf, _ = featureCache.fit_transform(trainData, word_analyzer, word_ngram_range)
+        charTfIdfVect, charTrainTFIdf, _ = featureCache.fit_transform(trainData, char_analyzer, char_ngram_range)
+        wordTrainTFIdf = wordTrainTFIdf[indexes]
+        charTrainTFIdf = charTrainTFIdf[indexes]
+        trainLabels = [trainLabels[i] for i in indexes]
+    else:
+        trainData = [trainData[i] for i in indexes]
+        trainLabels = [trainLabels[i] for i in indexes]
+        wordTrainTFIdf, wordTfIdfVect = createTFIDFVectorsFromTrainData(trainData, word_analyzer, word_ngram_range)
+        charTrainTFIdf, charTfIdfVect = createTFIDFVectorsFromTrainData(trainData, char_analyzer, char_ngram_range)
     combinedTrainTfIdf = hstack([wordTrainTFIdf, charTrainTFIdf])
 
     if re.search('svm', classifier, re.I):
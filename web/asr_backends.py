@@ -0,0 +1,31 @@
+import importlib
+
+
+class WhisperBackend:
+    """Transcribe with OpenAI Whisper; accepts a file path or 16 kHz float32 samples"""
+
+    def __init__(self, model_name='base', language='hi'):
+        # Imported here so the web process itself never loads torch
+        import whisper
+        self.model = whisper.load_model(model_name)
+        self.language = language
+
+    def transcribe(self, audio):
+        return self.model.transcribe(audio, language=self.language)['text']
+
+
+def load_asr_backend(spec):
+    """Create the ASR backend named by ``spec``.
+
+    ``whisper`` or ``whisper:<model size>`` loads Whisper. Anything else is
+    ``module:factory[:argument]``; the factory's return value only needs a
+    ``transcribe(audio)`` method returning text, so tests can plug in a stub.
+    """
+    name, _, argument = spec.partition(':')
+    if name == 'whisper':
+        return WhisperBackend(argument or 'base')
+    factory_name, _, argument = argument.partition(':')
+    if not factory_name:
+        raise ValueError(f"ASR backend must be 'whisper[:size]' or 'module:factory[:argument]', got {spec!r}")
+    factory = getattr(importlib.import_module(name), factory_name)
+    return factory(argument) if argument else factory()
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+
+import ffmpeg
+import numpy as np
+
+from asr_backends import load_asr_backend
+from model_artifact import load_model
+from model_registry import ModelRegistry
+
+SAMPLE_RATE = 16000
+
+# Per-process state, set up once by init_worker in every pool process
+asr_backend = None
+sentiment_models = None
+
+
+def init_worker(asr_backend_spec, sentiment_model_path):
+    """Load the ASR backend and the Hindi sentiment model once per worker process"""
+    global asr_backend, sentiment_models
+    asr_backend = load_asr_backend(asr_backend_spec)
+    # Re-stat'ed every few seconds, so model versions published by the online updater are picked up
+    sentiment_models = ModelRegistry(lambda paths: load_model(paths[0]))
+    sentiment_models.register('hi', [sentiment_model_path])
+    sentiment_models.preload()
+
+
+def worker_ready():
+    """No-op task: by the time it runs, the worker's initializer has loaded its models"""
+    return os.getpid()
+
+
+class AudioRejected(Exception):
+    """Raised for audio that cannot be decoded or exceeds the duration limit"""
+
+
+def iter_pcm_chunks(data, chunk_seconds=1.0, max_seconds=None):
+    """Pipe encoded audio bytes through ffmpeg and yield 16 kHz mono float32 chunks as they decode.
+
+    Nothing touches the filesystem. Decoding stops with ``AudioRejected``
+    as soon as the audio runs past ``max_seconds``.
+    """
+    output = {'format': 'f32le', 'ac': 1, 'ar': str(SAMPLE_RATE)}
+    if max_seconds:
+        # Decode just past the limit so longer clips are detected without decoding them in full
+        output['t'] = max_seconds + 1
+    process = (ffmpeg.input('pipe:')
+               .output('pipe:', **output)
+               .global_args('-hide_banner', '-loglevel', 'error')
+               .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True))
+
+    def feed():
+        try:
+            process.stdin.write(data)
+        except (BrokenPipeError, ValueError):
+            # ffmpeg stopped reading early, e.g. at the duration limit
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    # Write from another thread so a full stdout pipe can never deadlock the two
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    chunk_bytes = int(SAMPLE_RATE * chunk_seconds) * 4
+    limit = int(max_seconds * SAMPLE_RATE) if max_seconds else None
+    decoded = 0
+    try:
+        while True:
+            data_chunk = process.stdout.read(chunk_bytes)
+            if not data_chunk:
+                break
+            samples = np.frombuffer(data_chunk[:len(data_chunk) - len(data_chunk) % 4], dtype=np.float32)
+            decoded += len(samples)
+            if limit is not None and decoded > limit:
+                raise AudioRejected(f'Audio is longer than {max_seconds:g} seconds')
+            yield samples
+    finally:
+        process.stdout.close()
+        errors = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+        writer.join()
+    if returncode != 0:
+        raise AudioRejected(f"Audio decoding failed: {errors.decode('utf-8', 'replace').strip()}")
+
+
+def decode_audio(data, max_seconds=None):
+    """Decode a whole clip to one float32 array"""
+    chunks = list(iter_pcm_chunks(data, max_seconds=max_seconds))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float32)
+
+
+def transcribe_audio(audio):
+    """Transcribe a file path or 16 kHz float32 samples with the worker's ASR backend"""
+    return asr_backend.transcribe(audio)
+
+
+def predict_words(transcription):
+    # Each transcribed word is classified as its own line, as in /upload-asr
+    lines = transcription.split()
+    return lines, [str(p) for p in sentiment_models.get('hi').predict(lines)] if lines else []
+
+
+def process_segment(samples, start_sample):
+    """Transcribe and classify one speech segment; runs in a pool worker"""
+    start = time.perf_counter()
+    transcription = transcribe_audio(samples)
+    transcribe_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lines, predictions = predict_words(transcription)
+    return {
+        'start': start_sample / SAMPLE_RATE,
+        'end': (start_sample + len(samples)) / SAMPLE_RATE,
+        'text': transcription.strip(),
+        'lines': lines,
+        'predictions': predictions,
+        'timings': {'transcribe': transcribe_seconds, 'predict': time.perf_counter() - start},
+    }
+
+
+def process_audio_job(data, max_seconds=None):
+    """Decode, transcribe and classify one uploaded clip; runs in a pool worker"""
+    started_at = time.time()
+    timings = {}
+
+    start = time.perf_counter()
+    samples = decode_audio(data, max_seconds)
+    timings['convert'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transcription = transcribe_audio(samples)
+    timings['transcribe'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lines, predictions = predict_words(transcription)
+    timings['predict'] = time.perf_counter() - start
+
+    return {
+        'transcription': transcription,
+        'lines': lines,
+        'predictions': predictions,
+        'timings': timings,
+        'started_at': started_at,
+    }
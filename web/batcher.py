@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Merge the items of concurrent requests into batches for one ``handle`` call.
+
+    ``submit(items)`` queues a request's items and returns a Future of its
+    results. A background thread takes the first waiting request, collects
+    more for at most ``max_wait`` seconds or until ``max_batch`` items are
+    gathered, then calls ``handle(all items)`` once and hands each request
+    its slice of the results. While one batch runs the next one fills up,
+    so batches grow with load and per-call overhead is paid once per batch.
+    The thread runs once ``start()`` has been called.
+    """
+
+    def __init__(self, handle, max_batch=256, max_wait=0.005):
+        self._handle = handle
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'requests': 0,
+            'items': 0,
+            'largest_batch': 0,
+            'failed_batches': 0,
+            'handle_seconds': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, items):
+        future = Future()
+        self._queue.put((list(items), future))
+        return future
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        batches = snapshot['batches']
+        snapshot['mean_batch_items'] = snapshot['items'] / batches if batches else 0.0
+        snapshot['mean_batch_requests'] = snapshot['requests'] / batches if batches else 0.0
+        snapshot['queued'] = self._queue.qsize()
+        return snapshot
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self._max_wait
+        while size < self._max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for request_items, _ in batch for item in request_items]
+            start = time.perf_counter()
+            try:
+                results = self._handle(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                with self._lock:
+                    self._stats['failed_batches'] += 1
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            for request_items, future in batch:
+                future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['requests'] += len(batch)
+                self._stats['items'] += len(items)
+                self._stats['largest_batch'] = max(self._stats['largest_batch'], len(items))
+                self._stats['handle_seconds'] += elapsed
@@ -0,0 +1,147 @@
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobQueue:
+    """Bounded queue of background jobs run on an executor.
+
+    At most ``max_pending`` jobs may be queued or running at once; further
+    submissions raise ``QueueFull`` so the caller can push back on clients.
+    Finished jobs are kept for ``ttl`` seconds so clients can collect them.
+    Jobs submitted with ``progress=True`` get a ``report`` keyword argument
+    that appends partial results to the job while it runs.
+    """
+
+    def __init__(self, executor, max_pending, ttl=600):
+        self._executor = executor
+        self._max_pending = max_pending
+        self._ttl = ttl
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'run_seconds_total': 0.0,
+            'run_seconds_max': 0.0,
+        }
+
+    def submit(self, fn, *args, on_done=None, progress=False):
+        """Queue ``fn(*args)`` and return the new job id"""
+        with self._changed:
+            self._purge()
+            if self._pending() >= self._max_pending:
+                self._stats['rejected'] += 1
+                raise QueueFull(f"{self._max_pending} jobs already pending")
+            job_id = uuid.uuid4().hex
+            job = {
+                'id': job_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'partials': [],
+                'on_done': on_done,
+            }
+            self._jobs[job_id] = job
+            self._stats['submitted'] += 1
+        try:
+            kwargs = {'report': lambda partial: self._report(job, partial)} if progress else {}
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._changed:
+                del self._jobs[job_id]
+                self._stats['submitted'] -= 1
+            raise
+        job['future'] = future
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job_id
+
+    def get(self, job_id):
+        """Return a JSON-serialisable snapshot of a job, or None if unknown"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == 'queued' and job.get('future') is not None and job['future'].running():
+                job['status'] = 'running'
+            snapshot = {k: v for k, v in job.items() if k not in ('future', 'on_done')}
+            snapshot['partials'] = list(job['partials'])
+            return snapshot
+
+    def wait(self, job_id, since_status=None, since_partials=0, timeout=None):
+        """Block until the status differs from ``since_status`` or there are more than ``since_partials`` partials"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                snapshot = self.get(job_id)
+                if (snapshot is None or snapshot['status'] != since_status
+                        or len(snapshot['partials']) > since_partials):
+                    return snapshot
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return snapshot
+                # Running is not signalled by the executor, so re-check periodically.
+                self._changed.wait(0.5 if remaining is None else min(remaining, 0.5))
+
+    def stats(self):
+        """Queue depth, outcome counters and wait/run latency"""
+        with self._changed:
+            snapshot = dict(self._stats)
+            statuses = [self.get(job_id)['status'] for job_id in self._jobs]
+            snapshot['queued'] = statuses.count('queued')
+            snapshot['running'] = statuses.count('running')
+            snapshot['max_pending'] = self._max_pending
+            finished = self._stats['completed'] + self._stats['failed']
+            snapshot['wait_seconds_avg'] = self._stats['wait_seconds_total'] / finished if finished else 0.0
+            snapshot['run_seconds_avg'] = self._stats['run_seconds_total'] / finished if finished else 0.0
+            return snapshot
+
+    def _pending(self):
+        return sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+
+    def _purge(self):
+        cutoff = time.time() - self._ttl
+        for job_id in [k for k, job in self._jobs.items()
+                       if job['finished_at'] is not None and job['finished_at'] < cutoff]:
+            del self._jobs[job_id]
+
+    def _report(self, job, partial):
+        with self._changed:
+            job['partials'].append(partial)
+            self._changed.notify_all()
+
+    def _finish(self, job, future):
+        error = future.exception()
+        result = None if error is not None else future.result()
+        with self._changed:
+            job['finished_at'] = time.time()
+            if error is None:
+                job['status'] = 'done'
+                job['result'] = result
+                self._stats['completed'] += 1
+                # Workers report when they actually picked the job up.
+                started_at = result.get('started_at', job['submitted_at']) if isinstance(result, dict) else job['submitted_at']
+            else:
+                job['status'] = 'failed'
+                job['error'] = str(error)
+                self._stats['failed'] += 1
+                started_at = job['submitted_at']
+            wait = max(0.0, started_at - job['submitted_at'])
+            run = max(0.0, job['finished_at'] - started_at)
+            self._stats['wait_seconds_total'] += wait
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+            self._stats['run_seconds_total'] += run
+            self._stats['run_seconds_max'] = max(self._stats['run_seconds_max'], run)
+            self._changed.notify_all()
+        if job['on_done'] is not None:
+            job['on_done'](job['id'])
@@ -0,0 +1,50 @@
+import math
+
+SUPPORTED_LANGUAGES = ('hi', 'mr', 'te')
+
+
+def identify_languages(detector, lines):
+    """Return the fastText language code of every line using one batched call"""
+    if not lines:
+        return []
+    labels, _ = detector.predict(list(lines))
+    return [label[0].replace('__label__', '') for label in labels]
+
+
+def is_decisive(counts, remaining, z_threshold):
+    """Check whether the leading language can no longer lose the vote.
+
+    The lead is decisive when the remaining lines cannot overturn it, or when
+    a sign test between the leader and the runner-up exceeds ``z_threshold``.
+    """
+    ranked = sorted(counts.values(), reverse=True) + [0, 0]
+    leader, runner_up = ranked[0], ranked[1]
+    if leader - runner_up > remaining:
+        return True
+    if z_threshold is None or leader + runner_up == 0:
+        return False
+    return (leader - runner_up) / math.sqrt(leader + runner_up) >= z_threshold
+
+
+def majority_language(detector, lines, sample_size=None, chunk_size=1024, z_threshold=3.0):
+    """Majority-vote the supported language of ``lines``.
+
+    Lines are identified in batches of ``chunk_size`` and the vote stops as
+    soon as one of hi/mr/te has a decisive lead. ``sample_size`` limits the
+    vote to the first N lines. Returns ``(language, counts, examined)``.
+    """
+    if sample_size:
+        lines = lines[:sample_size]
+    counts = {}
+    examined = 0
+    while examined < len(lines):
+        chunk = lines[examined:examined + chunk_size]
+        for lang in identify_languages(detector, chunk):
+            if lang in SUPPORTED_LANGUAGES:
+                counts[lang] = counts.get(lang, 0) + 1
+        examined += len(chunk)
+        if counts and is_decisive(counts, len(lines) - examined, z_threshold):
+            break
+    if not counts:
+        raise Exception("No supported language detected in the input.")
+    return max(counts, key=counts.get), counts, examined
@@ -0,0 +1,513 @@
+"""Load generator for the web service.
+
+Replays a weighted mix of requests against the app at a fixed concurrency
+(closed loop) or a target request rate (open loop) and reports throughput,
+latency percentiles, error rate and the server's RSS over time:
+
+- ``upload``: POST /upload with lines sampled from a datasets/ file, as the
+  text form in script.js does;
+- ``predict``: POST /v1/predict with a few sampled lines;
+- ``audio``: POST /upload-audio with a bundled clip, poll /jobs/<id> until
+  the job finishes and fetch /upload-asr, as the recorder in script.js does.
+
+Each ``--config`` runs main.py in-process (through Flask's test client) in a
+fresh process with its own environment variables, so configurations are
+measured cold and side by side. ``--url`` drives an already running server
+over HTTP instead; give ``--server-pid`` to sample its RSS.
+"""
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+DATASETS_DIR = os.path.join(ROOT_DIR, 'datasets')
+CODES_DIR = os.path.join(ROOT_DIR, 'Codes')
+
+DEFAULT_TEXT_FILES = [os.path.join(DATASETS_DIR, name)
+                      for name in ('test-data.txt', 'test-data-marathi.txt', 'test-data-telugu.txt')]
+DEFAULT_AUDIO_FILES = [os.path.join(BASE_DIR, 'input_audio.webm')]
+SCENARIOS = ('upload', 'predict', 'audio')
+
+sys.path.insert(0, CODES_DIR)
+from dataset_store import read_spec
+
+
+class TestClientTarget:
+    """Requests through Flask's test client, one client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, form=None, files=None, json_body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        data = dict(form or {})
+        for field, (filename, content) in (files or {}).items():
+            data[field] = (io.BytesIO(content), filename)
+        response = client.open(path, method=method, data=data or None, json=json_body)
+        # Streamed bodies are produced while they are read, so read them whole
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+
+class HttpTarget:
+    """Requests to a running server over HTTP"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, form=None, files=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form or files:
+            boundary = uuid.uuid4().hex
+            parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+                     for name, value in (form or {}).items()]
+            for field, (filename, content) in (files or {}).items():
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                             f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+                             .encode('utf-8') + content + b'\r\n')
+            body = b''.join(parts) + f'--{boundary}--\r\n'.encode('utf-8')
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Workload:
+    """Builds and sends the requests of each scenario"""
+
+    def __init__(self, text_files, audio_files, upload_lines, predict_lines, poll_interval, audio_timeout):
+        self.texts = {}
+        for path in text_files:
+            store = read_spec(path)
+            if store is not None:
+                lines = store.texts()
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines = [line.strip() for line in f if line.strip()]
+            if lines:
+                self.texts[os.path.basename(path)] = lines
+        self.audio = []
+        for path in audio_files:
+            with open(path, 'rb') as f:
+                self.audio.append((os.path.basename(path), f.read()))
+        self.upload_lines = upload_lines
+        self.predict_lines = predict_lines
+        self.poll_interval = poll_interval
+        self.audio_timeout = audio_timeout
+
+    def sample_lines(self, rng, count):
+        # Lines come from one file, so a request has one majority language like a real upload
+        lines = self.texts[rng.choice(sorted(self.texts))]
+        if not count:
+            return lines
+        return [rng.choice(lines) for _ in range(count)]
+
+    def send(self, target, scenario, rng):
+        """Run one request of ``scenario``; return its final HTTP status"""
+        if scenario == 'upload':
+            content = '\n'.join(self.sample_lines(rng, self.upload_lines)).encode('utf-8')
+            status, _ = target.request('POST', '/upload', files={'file': ('input.txt', content)})
+            return status
+        if scenario == 'predict':
+            status, _ = target.request('POST', '/v1/predict',
+                                       json_body={'lines': self.sample_lines(rng, self.predict_lines)})
+            return status
+        if scenario == 'audio':
+            name, content = rng.choice(self.audio)
+            status, body = target.request('POST', '/upload-audio', files={'audio': (name, content)})
+            if status != 202:
+                return status
+            job_id = json.loads(body)['job_id']
+            deadline = time.monotonic() + self.audio_timeout
+            while True:
+                status, body = target.request('GET', f'/jobs/{job_id}')
+                if status != 200:
+                    return status
+                job_status = json.loads(body)['status']
+                if job_status == 'failed':
+                    return 'job_failed'
+                if job_status == 'done':
+                    break
+                if time.monotonic() > deadline:
+                    return 'job_timeout'
+                time.sleep(self.poll_interval)
+            status, _ = target.request('POST', '/upload-asr', form={'job_id': job_id})
+            return status
+        raise ValueError(f"Unknown scenario {scenario}")
+
+
+def process_rss_mb(pid):
+    """Resident memory of a process and all its descendants (e.g. ASR workers), or None off Linux"""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status', 'r') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children', 'r') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            if current == pid:
+                return None
+    return total / 1024
+
+
+class RssSampler(threading.Thread):
+    """Record ``(seconds since start, RSS MB)`` of a process every ``interval`` seconds"""
+
+    def __init__(self, pid, interval):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._start = time.perf_counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            rss = process_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append((round(time.perf_counter() - self._start, 3), round(rss, 1)))
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        rss = process_rss_mb(self.pid)
+        if rss is not None:
+            self.samples.append((round(time.perf_counter() - self._start, 3), round(rss, 1)))
+
+
+def wait_until_ready(target, timeout):
+    """Wait for GET /ready to return 200; servers without the route count as ready"""
+    deadline = time.monotonic() + timeout
+    while True:
+        status, body = target.request('GET', '/ready')
+        if status in (200, 404):
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server not ready after {timeout:.0f}s: {body[:200]!r}")
+        time.sleep(0.2)
+
+
+def run_load(target, workload, mix, concurrency, rps, duration, max_requests, seed):
+    """Send requests for ``duration`` seconds or ``max_requests`` requests.
+
+    Without ``rps`` each of ``concurrency`` threads sends its next request
+    as soon as the last one finishes. With ``rps`` requests are started on a
+    fixed schedule by up to ``concurrency`` threads, and latency is counted
+    from the scheduled start, so time spent waiting for a free thread when
+    the server falls behind is included.
+    Returns ``(scenario, start offset, latency, status)`` per request.
+    """
+    scenarios = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in scenarios]
+    results = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    sent = 0
+
+    def one(scenario, rng, scheduled):
+        try:
+            status = workload.send(target, scenario, rng)
+        except Exception as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        with lock:
+            results.append((scenario, scheduled - start, finished - scheduled, status))
+
+    if rps:
+        rng = random.Random(seed)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not max_requests or sent < max_requests:
+                scheduled = start + sent / rps
+                if scheduled >= deadline:
+                    break
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                request_rng = random.Random(rng.random())
+                pool.submit(one, rng.choices(scenarios, weights)[0], request_rng, scheduled)
+                sent += 1
+        return results
+
+    def worker(index):
+        nonlocal sent
+        rng = random.Random(seed * 1000003 + index)
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and sent >= max_requests:
+                    return
+                sent += 1
+            one(rng.choices(scenarios, weights)[0], rng, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'load-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def summarize(results, elapsed):
+    """Throughput, latency percentiles, error rate and status counts of a list of results"""
+    latencies = sorted(latency for _, _, latency, _ in results)
+    statuses = {}
+    for _, _, _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, _, _, status in results if not (isinstance(status, int) and status < 400))
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results) if results else 0.0,
+        'throughput': len(results) / elapsed if elapsed else 0.0,
+        'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+        'latency_p50': percentile(latencies, 0.50),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_p99': percentile(latencies, 0.99),
+        'latency_max': latencies[-1] if latencies else None,
+        'statuses': statuses,
+    }
+
+
+def measure(target, server_pid, options):
+    """Wait for the server, run the load and sample RSS; return the report of one configuration"""
+    workload = Workload(options['text_files'], options['audio_files'], options['upload_lines'],
+                        options['predict_lines'], options['poll_interval'], options['audio_timeout'])
+    rss_start = process_rss_mb(server_pid) if server_pid else None
+    ready_start = time.perf_counter()
+    wait_until_ready(target, options['ready_timeout'])
+    ready_seconds = time.perf_counter() - ready_start
+
+    sampler = RssSampler(server_pid, options['sample_interval']) if server_pid else None
+    if sampler is not None:
+        sampler.start()
+    start = time.perf_counter()
+    results = run_load(target, workload, options['mix'], options['concurrency'], options['rps'],
+                       options['duration'], options['requests'], options['seed'])
+    elapsed = time.perf_counter() - start
+    if sampler is not None:
+        sampler.stop()
+
+    samples = sampler.samples if sampler is not None else []
+    report = {
+        'ready_seconds': ready_seconds,
+        'elapsed_seconds': elapsed,
+        'total': summarize(results, elapsed),
+        'scenarios': {scenario: summarize([r for r in results if r[0] == scenario], elapsed)
+                      for scenario in options['mix'] if options['mix'][scenario] > 0},
+        'rss_mb': {
+            'before_ready': rss_start,
+            'start': samples[0][1] if samples else None,
+            'peak': max(rss for _, rss in samples) if samples else None,
+            'end': samples[-1][1] if samples else None,
+            'samples': samples,
+        },
+    }
+    return report
+
+
+def run_in_process(env, options, connection):
+    """Import main.py with ``env`` applied and measure it through the test client (in a fresh process)"""
+    try:
+        os.environ.update(env)
+        sys.path.insert(0, BASE_DIR)
+        import main
+        main.start_serving()
+        report = measure(TestClientTarget(main.app), os.getpid(), options)
+        if main.audio_executor is not None:
+            # Stop the ASR workers; they would outlive the os._exit below
+            main.audio_executor.shutdown(wait=True, cancel_futures=True)
+        connection.send(('ok', report))
+    except BaseException as e:
+        connection.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        connection.close()
+        # Background threads and ASR workers of the app must not keep the process alive
+        os._exit(0)
+
+
+def measure_config(name, env, options):
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_in_process, args=(env, options, sender), name=f'load-test-{name}')
+    process.start()
+    sender.close()
+    try:
+        outcome, payload = receiver.recv()
+    except EOFError:
+        outcome, payload = 'error', 'the process exited without a report'
+    process.join()
+    if outcome != 'ok':
+        raise RuntimeError(f"Configuration {name} failed: {payload}")
+    return payload
+
+
+def format_value(value, kind):
+    if value is None:
+        return '-'
+    if kind == 'ms':
+        return f'{value * 1000:.1f}'
+    if kind == 'rate':
+        return f'{value * 100:.2f}%'
+    if kind == 'mb':
+        return f'{value:.0f}'
+    if kind == 'count':
+        return str(value)
+    return f'{value:.1f}'
+
+
+REPORT_ROWS = [
+    ('requests', 'requests', 'count'),
+    ('throughput', 'req/s', 'float'),
+    ('error_rate', 'errors', 'rate'),
+    ('latency_p50', 'p50 ms', 'ms'),
+    ('latency_p95', 'p95 ms', 'ms'),
+    ('latency_p99', 'p99 ms', 'ms'),
+    ('latency_max', 'max ms', 'ms'),
+]
+
+
+def print_comparison(reports):
+    """One column per configuration: totals, each scenario, RSS and its timeline"""
+    names = list(reports)
+    width = max(12, *(len(name) + 2 for name in names))
+    print(f"{'':24}" + ''.join(f'{name:>{width}}' for name in names))
+    sections = ['total'] + sorted({scenario for r in reports.values() for scenario in r['scenarios']})
+    for section in sections:
+        for key, label, kind in REPORT_ROWS:
+            values = [(r['total'] if section == 'total' else r['scenarios'].get(section, {})).get(key)
+                      for r in reports.values()]
+            print(f'{section + " " + label:24}' + ''.join(f'{format_value(v, kind):>{width}}' for v in values))
+        statuses = [(r['total'] if section == 'total' else r['scenarios'].get(section, {})).get('statuses', {})
+                    for r in reports.values()]
+        print(f'{section + " statuses":24}' + ''.join(
+            f"{' '.join(f'{k}:{v}' for k, v in sorted(s.items())) or '-':>{width}}" for s in statuses))
+    for key, label in (('before_ready', 'RSS MB before ready'), ('start', 'RSS MB at start'),
+                       ('peak', 'RSS MB peak'), ('end', 'RSS MB at end')):
+        print(f'{label:24}' + ''.join(f"{format_value(r['rss_mb'][key], 'mb'):>{width}}" for r in reports.values()))
+    print(f"{'ready s':24}" + ''.join(f"{r['ready_seconds']:>{width}.2f}" for r in reports.values()))
+    for name, report in reports.items():
+        samples = report['rss_mb']['samples']
+        if samples:
+            step = max(1, len(samples) // 10)
+            timeline = ', '.join(f'{t:.0f}s {rss:.0f}' for t, rss in samples[::step])
+            print(f"RSS MB over time, {name}: {timeline}")
+
+
+def parse_mix(specs):
+    mix = {}
+    for spec in specs:
+        scenario, _, weight = spec.partition('=')
+        if scenario not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {scenario!r}; choose from {', '.join(SCENARIOS)}")
+        mix[scenario] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the web service with a weighted mix of text uploads, /v1/predict calls and audio "
+                    "jobs. Reports throughput, p50/p95/p99 latency, error rate and server RSS over time, side by "
+                    "side for every configuration.")
+    parser.add_argument('--config', nargs='+', action='append', default=[], metavar=('NAME', 'VAR=VALUE'),
+                        help="run main.py in-process with these environment variables; may be repeated, "
+                             "e.g. --config batched PREDICT_BATCH_WAIT_MS=5 --config unbatched PREDICT_BATCH_WAIT_MS=0")
+    parser.add_argument('--url', action='append', default=[],
+                        help="drive a running server instead, e.g. http://127.0.0.1:5000; may be repeated")
+    parser.add_argument('--server-pid', type=int, action='append', default=[],
+                        help="process id of each --url server, in the same order, to sample its RSS")
+    parser.add_argument('--mix', nargs='+', default=['upload=1', 'predict=1'], metavar='SCENARIO=WEIGHT',
+                        help=f"relative weights of {', '.join(SCENARIOS)}; audio needs a working ASR backend")
+    parser.add_argument('--concurrency', type=int, default=4, help="concurrent clients")
+    parser.add_argument('--rps', type=float, default=0,
+                        help="start requests at this rate instead of as fast as the clients finish them")
+    parser.add_argument('--duration', type=float, default=20, help="seconds of load per configuration")
+    parser.add_argument('--requests', type=int, default=0, help="stop after this many requests (0: no limit)")
+    parser.add_argument('--text-files', nargs='+', default=DEFAULT_TEXT_FILES,
+                        help="files (or dataset store specs, see Codes/dataset_store.py) lines are sampled from")
+    parser.add_argument('--upload-lines', type=int, default=200,
+                        help="lines per /upload request (0: a whole file)")
+    parser.add_argument('--predict-lines', type=int, default=8, help="lines per /v1/predict request")
+    parser.add_argument('--audio-files', nargs='+', default=DEFAULT_AUDIO_FILES)
+    parser.add_argument('--poll-interval', type=float, default=0.5, help="seconds between audio job polls")
+    parser.add_argument('--audio-timeout', type=float, default=300)
+    parser.add_argument('--ready-timeout', type=float, default=300, help="seconds to wait for GET /ready")
+    parser.add_argument('--sample-interval', type=float, default=1.0, help="seconds between RSS samples")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load-test-results.json')
+    args = parser.parse_args()
+
+    options = {
+        'mix': parse_mix(args.mix),
+        'concurrency': args.concurrency,
+        'rps': args.rps,
+        'duration': args.duration,
+        'requests': args.requests,
+        'text_files': args.text_files,
+        'audio_files': args.audio_files,
+        'upload_lines': args.upload_lines,
+        'predict_lines': args.predict_lines,
+        'poll_interval': args.poll_interval,
+        'audio_timeout': args.audio_timeout,
+        'ready_timeout': args.ready_timeout,
+        'sample_interval': args.sample_interval,
+        'seed': args.seed,
+    }
+    configs = [(spec[0], dict(var.split('=', 1) for var in spec[1:])) for spec in args.config]
+    if not configs and not args.url:
+        configs = [('default', {})]
+
+    reports = {}
+    details = {}
+    for name, env in configs:
+        print(f"Running {name} in-process" + (f" with {' '.join(f'{k}={v}' for k, v in env.items())}" if env else ''))
+        reports[name] = measure_config(name, env, options)
+        details[name] = {'env': env}
+    for i, url in enumerate(args.url):
+        print(f"Running against {url}")
+        server_pid = args.server_pid[i] if i < len(args.server_pid) else None
+        reports[url] = measure(HttpTarget(url), server_pid, options)
+        details[url] = {'url': url, 'server_pid': server_pid}
+
+    print_comparison(reports)
+    with open(args.output, 'w', encoding='utf-8') as outputFile:
+        json.dump({'options': options, 'results': {name: dict(details[name], **report)
+                                                   for name, report in reports.items()}},
+                  outputFile, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
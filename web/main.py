@@ -1,11 +1,20 @@
+import io
+import json
+import multiprocessing
 import os
-import whisper
-import ffmpeg
-from flask import Flask, request, send_file, send_from_directory, jsonify
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import Flask, Request, Response, g, request, send_file, send_from_directory, jsonify, stream_with_context
 from flask_cors import CORS
-from scipy.sparse import hstack
-from pickle import load
-import fasttext
+from werkzeug.exceptions import RequestEntityTooLarge
+from model_registry import ModelRegistry
+from language_id import SUPPORTED_LANGUAGES, identify_languages, majority_language
+from jobs import JobQueue, QueueFull
+from prediction_cache import PredictionCache
+from metrics import Metrics, RequestTimer, SlowRequestLog, register_service_metrics
+from batcher import MicroBatcher
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='.', template_folder='.')
@@ -15,84 +24,415 @@ CORS(app)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = BASE_DIR  # Points to the 'web' directory
 MODEL_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'Model2'))
+CODES_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'Codes'))
+
+# Shared inference code lives next to the offline scripts in Codes/
+sys.path.insert(0, CODES_DIR)
+from model_artifact import load_model as load_compiled_model
+from online_update import RUNTIME_DIR, BackgroundUpdater, FeedbackLog, OnlineUpdater, live_model_path, prepare_live_models, refresh_live_model
 
 # File paths
-PREDICTION_FILE = os.path.join(UPLOAD_FOLDER, 'test-predictions.txt')
 FASTTEXT_MODEL_PATH = os.path.join(MODEL_DIR, 'fasttext', 'lid.176.ftz')
 
 # Configure upload folder
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Load models
-lang_detector = fasttext.load_model(FASTTEXT_MODEL_PATH)
-whisper_model = whisper.load_model("base")
+class AudioUploadBuffer(io.BytesIO):
+    """In-memory upload buffer that refuses to grow past ``limit`` bytes"""
 
-# Helper functions
-def read_lines(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f if line.strip()]
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data):
+        if self.tell() + len(data) > self.limit:
+            raise RequestEntityTooLarge()
+        return super().write(data)
+
+class AppRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Audio stays in memory all the way to ffmpeg instead of spooling to a temp file
+        if self.path == '/upload-audio':
+            return AudioUploadBuffer(AUDIO_MAX_BYTES)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+app.request_class = AppRequest
+
+# Model registry settings
+LANG_PREFIXES = {'hi': 'hindi', 'mr': 'marathi', 'te': 'telugu'}
+MODEL_CACHE_MAX_MB = os.environ.get('MODEL_CACHE_MAX_MB')
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', '2'))
+MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', '1') == '1'
+
+# Deployment profile: 'text' serves only the text routes, 'audio' only the audio routes, 'all' both.
+# Only the profile's models are preloaded, and the audio stack is imported when first needed.
+SERVE_PROFILE = os.environ.get('SERVE_PROFILE', 'all')
+if SERVE_PROFILE not in ('text', 'audio', 'all'):
+    raise ValueError(f"SERVE_PROFILE must be text, audio or all, got {SERVE_PROFILE!r}")
+SERVES_TEXT = SERVE_PROFILE in ('text', 'all')
+SERVES_AUDIO = SERVE_PROFILE in ('audio', 'all')
+TEXT_ROUTES = {'/upload', '/v1/predict', '/feedback'}
+AUDIO_ROUTES = {'/upload-audio', '/upload-asr', '/jobs', '/jobs/<job_id>', '/jobs/<job_id>/events'}
+
+# Language identification settings
+LANG_ID_SAMPLE = int(os.environ.get('LANG_ID_SAMPLE', '0')) or None
+LANG_ID_CHUNK = int(os.environ.get('LANG_ID_CHUNK', '1024'))
+
+# Routing mode for text uploads: 'majority' (one model per file) or 'per-line'
+LANG_ROUTING = os.environ.get('LANG_ROUTING', 'majority')
+ROUTING_WORKERS = int(os.environ.get('ROUTING_WORKERS', '3'))
+routing_pool = ThreadPoolExecutor(max_workers=ROUTING_WORKERS) if ROUTING_WORKERS > 1 else None
+
+# Audio job settings: worker processes, pending-job cap (HTTP 429 beyond it), result retention
+AUDIO_WORKERS = int(os.environ.get('AUDIO_WORKERS', '1'))
+AUDIO_QUEUE_SIZE = int(os.environ.get('AUDIO_QUEUE_SIZE', '8'))
+JOB_TTL = float(os.environ.get('JOB_TTL', '600'))
+WHISPER_MODEL_NAME = os.environ.get('WHISPER_MODEL', 'base')
+# Uploads larger or longer than this are rejected before or while decoding
+AUDIO_MAX_BYTES = int(float(os.environ.get('AUDIO_MAX_MB', '25')) * 1024 * 1024)
+AUDIO_MAX_SECONDS = float(os.environ.get('AUDIO_MAX_SECONDS', '600')) or None
+# 'whisper[:size]', or 'module:factory[:argument]' for any object with transcribe(audio)
+ASR_BACKEND = os.environ.get('ASR_BACKEND', f'whisper:{WHISPER_MODEL_NAME}')
+# Streaming mode splits clips on pauses and reports each segment as it is transcribed
+AUDIO_STREAMING = os.environ.get('AUDIO_STREAMING', '1') == '1'
 
-def write_lines(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(data))
+# Prediction cache: in-memory LRU size in lines (0 disables) and optional SQLite file
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '100000'))
+PREDICTION_CACHE_DB = os.environ.get('PREDICTION_CACHE_DB')
 
-def load_pickle(file_path):
-    with open(file_path, 'rb') as f:
-        return load(f)
+# JSON prediction API: concurrent /v1/predict requests are merged into batches of up to
+# PREDICT_BATCH_LINES lines, waiting at most PREDICT_BATCH_WAIT_MS for more to arrive
+PREDICT_BATCH_LINES = int(os.environ.get('PREDICT_BATCH_LINES', '256'))
+PREDICT_BATCH_WAIT_MS = float(os.environ.get('PREDICT_BATCH_WAIT_MS', '5'))
+PREDICT_MAX_LINES = int(os.environ.get('PREDICT_MAX_LINES', '1000'))
+
+# Online updates: labelled lines posted to /feedback are appended to FEEDBACK_LOG and applied to the
+# compiled models every ONLINE_UPDATE_INTERVAL seconds (0 leaves it to Codes/online_update.py).
+# Models are served from live copies in MODEL_RUNTIME_DIR/models, so Model2/ is never written to.
+MODEL_RUNTIME_DIR = os.environ.get('MODEL_RUNTIME_DIR', RUNTIME_DIR)
+FEEDBACK_LOG = os.environ.get('FEEDBACK_LOG', os.path.join(MODEL_RUNTIME_DIR, 'feedback.jsonl'))
+ONLINE_UPDATE_INTERVAL = float(os.environ.get('ONLINE_UPDATE_INTERVAL', '0'))
+ONLINE_UPDATE_MIN_EXAMPLES = int(os.environ.get('ONLINE_UPDATE_MIN_EXAMPLES', '20'))
+
+# Requests slower than this many seconds are logged with their stage breakdown (0 disables);
+# the log goes to SLOW_REQUEST_LOG as JSON lines, or to stdout when unset
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '0'))
+SLOW_REQUEST_LOG = os.environ.get('SLOW_REQUEST_LOG')
+
+# Text uploads are read, predicted and sent back this many lines at a time. In majority
+# routing the language is detected from the first batch only, so this also caps that sample.
+STREAM_BATCH_LINES = int(os.environ.get('STREAM_BATCH_LINES', '4096'))
+# Last line of a text upload response that failed after its first batch had been sent
+STREAM_ERROR_MARKER = '#ERROR'
+
+metrics = Metrics()
+register_service_metrics(metrics)
+slow_request_log = SlowRequestLog(SLOW_REQUEST_SECONDS, SLOW_REQUEST_LOG) if SLOW_REQUEST_SECONDS > 0 else None
+
+# Heavy models and the audio stack are loaded on first use, or up front by the warm-up thread
+lang_detector = None
+lang_detector_lock = threading.Lock()
+audio_worker = streaming_asr = None
+audio_executor = audio_jobs = None
+audio_stack_lock = threading.Lock()
+audio_warmup = []
+
+def get_lang_detector():
+    """The fastText language identifier, loaded on first use"""
+    global lang_detector
+    if lang_detector is None:
+        with lang_detector_lock:
+            if lang_detector is None:
+                import fasttext
+                lang_detector = fasttext.load_model(FASTTEXT_MODEL_PATH)
+    return lang_detector
+
+# Helper functions
+def iter_line_batches(stream, batch_size):
+    """Yield the non-empty lines of an uploaded file in batches, straight from its stream"""
+    batch = []
+    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+        line = line.strip()
+        if line:
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def send_lines(data, download_name):
+    """Send lines as a file download without writing them to disk"""
+    body = io.BytesIO('\n'.join(data).encode('utf-8'))
+    return send_file(body, as_attachment=True, download_name=download_name)
 
 def detect_language(lines):
-    counts = {}
-    for line in lines:
-        pred = lang_detector.predict(line)[0][0].replace('__label__', '')
-        if pred in ['hi', 'mr', 'te']:
-            counts[pred] = counts.get(pred, 0) + 1
-    if not counts:
-        raise Exception("No supported language detected in the input.")
-    return max(counts, key=counts.get)
+    """Majority language of the input, stopping once the vote is decisive"""
+    language, _, _ = majority_language(
+        get_lang_detector(), lines, sample_size=LANG_ID_SAMPLE, chunk_size=LANG_ID_CHUNK)
+    return language
+
+def detect_line_languages(lines):
+    """Language code of every line, from a single batched fastText call"""
+    return identify_languages(get_lang_detector(), lines)
+
+prediction_cache = (PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DB)
+                    if PREDICTION_CACHE_SIZE or PREDICTION_CACHE_DB else None)
+
+def load_bundle(paths):
+    """Map a compiled model (see Codes/export_compiled_model.py) read-only"""
+    # A re-exported released model replaces its live copy first
+    refresh_live_model(released_by_live[paths[0]], paths[0])
+    model = load_compiled_model(paths[0])
+    if prediction_cache is not None:
+        prediction_cache.track_source(paths[0], model)
+    return model
+
+LIVE_MODEL_DIR = os.path.join(MODEL_RUNTIME_DIR, 'models')
+released_model_paths = {prefix: os.path.join(MODEL_DIR, f"{prefix}-compiled-svm.bin")
+                        for prefix in LANG_PREFIXES.values()}
+released_by_live = {live_model_path(path, LIVE_MODEL_DIR): path for path in released_model_paths.values()}
+
+def bundle_paths(prefix):
+    return (live_model_path(released_model_paths[prefix], LIVE_MODEL_DIR),)
+
+model_registry = ModelRegistry(
+    load_bundle,
+    max_bytes=int(float(MODEL_CACHE_MAX_MB) * 1024 * 1024) if MODEL_CACHE_MAX_MB else None,
+    reload_interval=MODEL_RELOAD_INTERVAL if MODEL_RELOAD_INTERVAL > 0 else None,
+)
+# Re-exporting a released model reloads its bundles just as publishing a new live version does
+for code, prefix in LANG_PREFIXES.items():
+    model_registry.register(code, bundle_paths(prefix), watch=[released_model_paths[prefix]])
+model_registry.register('asr', bundle_paths('hindi'), watch=[released_model_paths['hindi']])
+
+def swap_published_model(language, path, version):
+    """Load a newly published model version and swap it in for every bundle built from it"""
+    keys = model_registry.swap(path)
+    print(f"Swapped in {path} version {version} for {', '.join(keys)}")
+
+feedback_log = FeedbackLog(FEEDBACK_LOG)
+online_updater = OnlineUpdater(
+    feedback_log,
+    {code: bundle_paths(prefix)[0] for code, prefix in LANG_PREFIXES.items()},
+    min_examples=ONLINE_UPDATE_MIN_EXAMPLES,
+    on_publish=swap_published_model,
+)
 
 def load_hindi_models():
     """Load Hindi models specifically for audio processing"""
-    word_vect = load_pickle(os.path.join(MODEL_DIR, "train-vect-word-svm.pkl"))
-    char_vect = load_pickle(os.path.join(MODEL_DIR, "train-vect-char-svm.pkl"))
-    clf = load_pickle(os.path.join(MODEL_DIR, "classifier-svm.pkl"))
-    return word_vect, char_vect, clf
+    return model_registry.get('asr')
 
 def load_models(language):
     """Load language-specific models for text processing"""
-    lang_map = {'hi': 'hindi', 'mr': 'marathi', 'te': 'telugu'}
-    prefix = lang_map[language]
-    word_vect = load_pickle(os.path.join(MODEL_DIR, f"{prefix}-train-vect-word-svm.pkl"))
-    char_vect = load_pickle(os.path.join(MODEL_DIR, f"{prefix}-train-vect-char-svm.pkl"))
-    clf = load_pickle(os.path.join(MODEL_DIR, f"{prefix}-classifier-svm.pkl"))
-    return word_vect, char_vect, clf
-
-def predict_sentiment(lines, word_vect, char_vect, clf):
+    return model_registry.get(language)
+
+def predict_sentiment(lines, model):
     """Core prediction function used by both text and audio paths"""
-    word_tf = word_vect.transform(lines)
-    char_tf = char_vect.transform(lines)
-    combined_tf = hstack([word_tf, char_tf])
-    return clf.predict(combined_tf)
+    if prediction_cache is not None:
+        return prediction_cache.predict(model, lines)
+    return model.predict(lines)
+
+def predict_routed(lines, fallback=None):
+    """Classify each line with the model of its own detected language.
+
+    Lines are grouped by language, every group goes through its bundle once
+    (concurrently when a routing pool is configured), and predictions are
+    written back in the original order. Lines in an unsupported language use
+    the majority language of the batch, or ``fallback`` (the majority of an
+    earlier batch of the same file) when no line has a supported language.
+    Returns the predictions and the language used for unsupported lines.
+    """
+    languages = detect_line_languages(lines)
+    counts = {}
+    for lang in languages:
+        if lang in SUPPORTED_LANGUAGES:
+            counts[lang] = counts.get(lang, 0) + 1
+    if counts:
+        fallback = max(counts, key=counts.get)
+    elif fallback is None:
+        raise Exception("No supported language detected in the input.")
+    else:
+        counts[fallback] = 0
+
+    groups = {}
+    for i, lang in enumerate(languages):
+        groups.setdefault(lang if lang in counts else fallback, []).append(i)
+
+    def run_group(language, indexes):
+        return predict_sentiment([lines[i] for i in indexes], load_models(language))
+
+    if routing_pool is not None and len(groups) > 1:
+        futures = {lang: routing_pool.submit(run_group, lang, idx) for lang, idx in groups.items()}
+        results = {lang: future.result() for lang, future in futures.items()}
+    else:
+        results = {lang: run_group(lang, idx) for lang, idx in groups.items()}
+
+    preds = [None] * len(lines)
+    for lang, indexes in groups.items():
+        for i, pred in zip(indexes, results[lang]):
+            preds[i] = pred
+    return preds, fallback
+
+def score_lines(items):
+    """Label and decision score of ``(language, line)`` pairs merged from concurrent requests.
 
-def convert_to_wav(input_path, output_path):
-    """Convert audio file to WAV format"""
+    Lines without a language are identified in one fastText call, and each
+    language's lines go through its model in one call, with repeated lines
+    scored once. Lines in an unsupported language get no label.
+    """
+    languages = [language for language, _ in items]
+    missing = [i for i, language in enumerate(languages) if language is None]
+    for i, language in zip(missing, detect_line_languages([items[i][1] for i in missing])):
+        languages[i] = language
+
+    results = [{'language': language, 'label': None, 'score': None} for language in languages]
+    groups = {}
+    for i, language in enumerate(languages):
+        if language in LANG_PREFIXES:
+            groups.setdefault(language, []).append(i)
+    for language, indexes in groups.items():
+        model = load_models(language)
+        unique = {}
+        rows = [unique.setdefault(model.normalize(items[i][1]), len(unique)) for i in indexes]
+        labels, scores = model.predict_with_scores(list(unique))
+        for i, row in zip(indexes, rows):
+            results[i]['label'] = str(labels[row])
+            results[i]['score'] = float(scores[row])
+    return results
+
+prediction_batcher = MicroBatcher(score_lines, max_batch=PREDICT_BATCH_LINES,
+                                  max_wait=PREDICT_BATCH_WAIT_MS / 1000)
+
+def start_audio_stack():
+    """Import the audio modules and start the ASR worker pool on first use; return the job queue"""
+    global audio_worker, streaming_asr, audio_executor, audio_jobs
+    with audio_stack_lock:
+        if audio_jobs is not None:
+            return audio_jobs
+        import audio_worker
+        import streaming_asr
+        # The ASR model runs in worker processes that each load it once, so
+        # transcription never blocks a request thread. The server has threads
+        # running by now, so workers come from a single-threaded fork server
+        # that has imported only audio_worker, never from this process.
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['audio_worker'])
+        audio_executor = ProcessPoolExecutor(
+            max_workers=AUDIO_WORKERS,
+            mp_context=context,
+            initializer=audio_worker.init_worker,
+            initargs=(ASR_BACKEND, bundle_paths('hindi')[0]),
+        )
+        if AUDIO_STREAMING:
+            # One light thread per pending job decodes and segments its clip and
+            # feeds the segments to the shared worker processes.
+            audio_jobs = JobQueue(ThreadPoolExecutor(max_workers=AUDIO_QUEUE_SIZE),
+                                  max_pending=AUDIO_QUEUE_SIZE, ttl=JOB_TTL)
+        else:
+            audio_jobs = JobQueue(audio_executor, max_pending=AUDIO_QUEUE_SIZE, ttl=JOB_TTL)
+        return audio_jobs
+
+def get_audio_job(job_id):
+    return audio_jobs.get(job_id) if audio_jobs is not None else None
+
+warmup_done = threading.Event()
+warmup_error = None
+
+def warm_up():
+    """Load the models of the serving profile so the first requests pay no load time"""
+    global warmup_error
+    start = time.perf_counter()
     try:
-        ffmpeg.input(input_path).output(output_path, ac=1, ar='16000').run(
-            overwrite_output=True, quiet=True)
-        return True
-    except ffmpeg.Error as e:
-        print("Audio conversion error:", e)
-        return False
-
-def transcribe_audio(audio_path, output_txt_path=None):
-    """Transcribe audio using Whisper and write each word on a new line"""
-    result = whisper_model.transcribe(audio_path, language="hi")
-    transcription = result["text"]
-    if output_txt_path:
-        # Split transcription into words and write each on a new line
-        words = transcription.split()
-        with open(output_txt_path, "w", encoding="utf-8") as f:
-            f.write('\n'.join(words))
-    return transcription
+        if SERVES_TEXT:
+            get_lang_detector()
+            model_registry.preload(list(LANG_PREFIXES))
+        if SERVES_AUDIO:
+            model_registry.preload(['asr'])
+            start_audio_stack()
+            # Each worker loads the ASR backend in its initializer, before running its first task
+            audio_warmup.extend(audio_executor.submit(audio_worker.worker_ready) for _ in range(AUDIO_WORKERS))
+            for future in audio_warmup:
+                future.result()
+    except Exception as e:
+        warmup_error = f'{type(e).__name__}: {e}'
+        print(f"Warm-up failed: {warmup_error}")
+        return
+    print(f"Warm-up of the {SERVE_PROFILE} profile finished in {time.perf_counter() - start:.1f}s")
+    warmup_done.set()
+
+serving_started = False
+serving_lock = threading.Lock()
+
+def start_serving():
+    """Create the live models and start the background threads of the server, once.
+
+    Importing this module starts nothing: the ASR worker processes re-import
+    it, and must not start updaters, batchers or worker pools of their own.
+    """
+    global serving_started
+    with serving_lock:
+        if serving_started:
+            return
+        serving_started = True
+    prepare_live_models(released_model_paths, LIVE_MODEL_DIR)
+    prediction_batcher.start()
+    if ONLINE_UPDATE_INTERVAL > 0:
+        BackgroundUpdater(online_updater, ONLINE_UPDATE_INTERVAL).start()
+    if MODEL_PRELOAD:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    else:
+        warmup_done.set()
+
+def record_audio_job(job_id):
+    """Report a finished audio job's worker-side stage timings"""
+    job = get_audio_job(job_id)
+    if job is None:
+        return
+    metrics.inc('aspect_requests_total', route='audio_job', status=job['status'])
+    if job['status'] != 'done':
+        metrics.inc('aspect_errors_total', route='audio_job', stage='job')
+        return
+    for name, seconds in job['result']['timings'].items():
+        metrics.observe('aspect_stage_duration_seconds', seconds, route='audio_job', stage=name, language='hi')
+    metrics.inc('aspect_lines_total', len(job['result']['predictions']), route='audio_job', language='hi')
+
+metrics.gauge('aspect_audio_jobs', 'Audio jobs waiting or running', lambda: {
+    (('status', status),): count
+    for status, count in (audio_jobs.stats().items() if audio_jobs is not None else ())
+    if status in ('queued', 'running')})
+metrics.gauge('aspect_models_resident', 'Model bundles held in memory',
+              lambda: len(model_registry.stats()['resident']))
+metrics.gauge('aspect_predict_batch_lines', 'Mean lines per /v1/predict model call',
+              lambda: prediction_batcher.stats()['mean_batch_items'])
+if prediction_cache is not None:
+    metrics.gauge('aspect_prediction_cache_hit_ratio', 'Fraction of lines served from the prediction cache',
+                  lambda: prediction_cache.stats()['hit_ratio'])
+
+@app.before_request
+def start_request_timer():
+    g.timer = RequestTimer(request.url_rule.rule if request.url_rule is not None else 'unmatched')
+    if (g.timer.route in TEXT_ROUTES and not SERVES_TEXT) or (g.timer.route in AUDIO_ROUTES and not SERVES_AUDIO):
+        return jsonify({'error': f'Not served by the {SERVE_PROFILE} profile'}), 404
+
+@app.after_request
+def finish_request_timer(response):
+    timer = g.get('timer')
+    if timer is None:
+        return response
+    if response.is_streamed:
+        # The body is produced after this hook, so record once it has been sent
+        response.call_on_close(lambda: timer.finish(metrics, response.status_code, slow_request_log))
+    else:
+        timer.finish(metrics, response.status_code, slow_request_log)
+    return response
+
+@app.teardown_request
+def record_unhandled_error(exc):
+    timer = g.get('timer')
+    if exc is not None and timer is not None:
+        timer.error('unhandled', exc)
+        timer.finish(metrics, 500, slow_request_log)
 
 # Routes
 @app.route('/')
@@ -103,24 +443,160 @@ def index():
 def static_files(path):
     return send_from_directory('.', path)
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, stage and error metrics in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def readiness():
+    """Report which models are warm; 503 until the profile's warm-up has finished"""
+    resident = set(model_registry.stats()['resident'])
+    models = {}
+    if SERVES_TEXT:
+        models['lang_id'] = lang_detector is not None
+        models.update({code: code in resident for code in LANG_PREFIXES})
+    if SERVES_AUDIO:
+        models['asr'] = 'asr' in resident
+        models['asr_workers'] = sum(f.done() and f.exception() is None for f in list(audio_warmup))
+    ready = warmup_done.is_set()
+    body = {'profile': SERVE_PROFILE, 'ready': ready, 'models': models, 'error': warmup_error}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/model-stats')
+def model_stats():
+    """Report model registry and prediction cache counters"""
+    stats = model_registry.stats()
+    stats['prediction_cache'] = prediction_cache.stats() if prediction_cache is not None else None
+    stats['online_updates'] = online_updater.stats()
+    stats['predict_batcher'] = prediction_batcher.stats()
+    return jsonify(stats)
+
+@app.route('/feedback', methods=['POST'])
+def handle_feedback():
+    """Log corrected labels for the online updater.
+
+    The body is one ``{"text", "label", "language"}`` object or a list of
+    them; a missing language is detected from the text.
+    """
+    body = request.get_json(silent=True)
+    entries = body if isinstance(body, list) else [body]
+    if not all(isinstance(e, dict) and isinstance(e.get('text'), str) and isinstance(e.get('label'), str)
+               for e in entries):
+        return jsonify({'error': 'Expected {"text", "label"} objects'}), 400
+
+    # fastText reads one line per call, and the feedback log holds one line per example
+    texts = [' '.join(e['text'].split()) for e in entries]
+    missing = [i for i, e in enumerate(entries) if not e.get('language')]
+    detected = dict(zip(missing, detect_line_languages([texts[i] for i in missing]))) if missing else {}
+    accepted = []
+    rejected = 0
+    for i, entry in enumerate(entries):
+        language = entry.get('language') or detected[i]
+        if language in LANG_PREFIXES and texts[i] and entry['label'].strip():
+            accepted.append((language, texts[i], entry['label'].strip()))
+        else:
+            rejected += 1
+    feedback_log.append(accepted)
+    return jsonify({'accepted': len(accepted), 'rejected': rejected}), 202
+
+@app.route('/jobs')
+def job_stats():
+    """Report audio queue depth, outcomes and latency"""
+    return jsonify(audio_jobs.stats() if audio_jobs is not None else {})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll the status (and, once done, the result) of an audio job"""
+    job = get_audio_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream an audio job's partial results and status changes as server-sent events"""
+    if get_audio_job(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def events():
+        status = None
+        sent = 0
+        while True:
+            job = audio_jobs.wait(job_id, since_status=status, since_partials=sent, timeout=15)
+            if job is None:
+                return
+            if job['status'] == status and len(job['partials']) == sent:
+                # Keep idle connections open through proxies
+                yield ': keep-alive\n\n'
+                continue
+            for partial in job['partials'][sent:]:
+                yield f"event: partial\ndata: {json.dumps(partial)}\n\n"
+            sent = len(job['partials'])
+            if job['status'] != status:
+                status = job['status']
+                yield f"event: {status}\ndata: {json.dumps(job)}\n\n"
+            if status in ('done', 'failed'):
+                return
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/upload-asr', methods=['POST'])
 def process_asr_text():
     """Process transcribed text from audio (Hindi only)"""
+    # The transcript and its predictions belong to the audio job, so
+    # concurrent users never read each other's results.
+    job_id = request.values.get('job_id')
+    if not job_id:
+        return 'No job_id given', 400
+    job = get_audio_job(job_id)
+    if job is None:
+        return 'Unknown job', 404
+    if job['status'] != 'done':
+        return f"Job is {job['status']}", 409
+    with g.timer.span('send'):
+        return send_lines(job['result']['predictions'], 'asr-predictions.txt')
+
+@app.route('/v1/predict', methods=['POST'])
+def predict_json():
+    """Classify a few lines and return each label with its decision score.
+
+    The body is ``{"lines": [...]}`` or ``{"text": "..."}``, with an optional
+    ``"language"`` (hi, mr or te) that skips language identification.
+    Concurrent requests share batched model calls.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    lines = [body['text']] if isinstance(body.get('text'), str) else body.get('lines')
+    if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+        return jsonify({'error': 'Expected "lines" (a list of strings) or "text"'}), 400
+    if len(lines) > PREDICT_MAX_LINES:
+        return jsonify({'error': f'At most {PREDICT_MAX_LINES} lines per request'}), 413
+    language = body.get('language')
+    if language is not None and language not in LANG_PREFIXES:
+        return jsonify({'error': f'Unsupported language {language!r}'}), 400
+    if not lines:
+        return jsonify({'predictions': []})
+
+    g.timer.language = language or ''
+    # fastText reads one line per call, so embedded newlines are folded into spaces
+    lines = [' '.join(line.split()) for line in lines]
+    # Blank lines get a null prediction, as /upload skips them
+    scored = [i for i, line in enumerate(lines) if line]
+    predictions = [{'language': None, 'label': None, 'score': None} for _ in lines]
     try:
-        input_path = os.path.join(UPLOAD_FOLDER, 'asr-text.txt')
-        output_path = os.path.join(UPLOAD_FOLDER, 'test-predictions.txt')
-        
-        # Load Hindi models directly (no language detection needed)
-        word_vect, char_vect, clf = load_hindi_models()
-        
-        lines = read_lines(input_path)
-        preds = predict_sentiment(lines, word_vect, char_vect, clf)
-        write_lines(output_path, [str(p) for p in preds])
-        
-        return send_file(output_path, as_attachment=True, download_name='asr-predictions.txt')
+        with g.timer.span('predict'):
+            if scored:
+                results = prediction_batcher.submit([(language, lines[i]) for i in scored]).result(timeout=30)
+                for i, result in zip(scored, results):
+                    predictions[i] = result
     except Exception as e:
-        print(f"ASR processing error: {e}")
-        return "Processing failed", 500
+        g.timer.error('predict', e)
+        return jsonify({'error': 'Prediction failed'}), 500
+    g.timer.lines += len(scored)
+    return jsonify({'predictions': predictions})
 
 @app.route('/upload', methods=['POST'])
 def handle_text_upload():
@@ -132,29 +608,81 @@ def handle_text_upload():
     if file.filename == '':
         return 'No selected file', 400
 
-    text_path = os.path.join(UPLOAD_FOLDER, 'unlabeled_reviews.txt')
-    file.save(text_path)
-
+    # Take ownership of the upload stream: the request closes its files when
+    # the view returns, but the response keeps reading after that.
+    stream, file.stream = file.stream, io.BytesIO()
+    timer = g.timer
+    current = 'read'
     try:
-        # Detect language first using FastText
-        lines = read_lines(text_path)
-        language = detect_language(lines)
-        
-        # Load appropriate language models
-        word_vect, char_vect, clf = load_models(language)
-        
-        # Predict sentiment
-        preds = predict_sentiment(lines, word_vect, char_vect, clf)
-        write_lines(PREDICTION_FILE, [str(p) for p in preds])
-        
-        return send_file(PREDICTION_FILE, as_attachment=True, download_name='predictions.txt')
+        batches = iter_line_batches(stream, STREAM_BATCH_LINES)
+        with timer.span('read'):
+            first_batch = next(batches, [])
+        if request.form.get('routing', LANG_ROUTING) == 'per-line':
+            # Route every line to the model of its own language
+            timer.language = 'per-line'
+            routing_fallback = None
+
+            def predict_batch(lines):
+                # A batch with no supported language falls back to the file's majority so far
+                nonlocal routing_fallback
+                preds, routing_fallback = predict_routed(lines, routing_fallback)
+                return preds
+        else:
+            # Detect language first using FastText, from the first batch
+            current = 'detect_language'
+            with timer.span(current):
+                language = detect_language(first_batch)
+            timer.language = language
+
+            # Load appropriate language models
+            current = 'load_model'
+            with timer.span(current):
+                model = load_models(language)
+            predict_batch = lambda lines: predict_sentiment(lines, model)
+
+        # Predict the first batch up front so failures still get a 500
+        current = 'predict'
+        with timer.span(current):
+            first_preds = predict_batch(first_batch)
+        timer.lines += len(first_batch)
     except Exception as e:
+        stream.close()
+        timer.error(current, e)
         print(f"Text processing error: {e}")
         return 'Processing failed', 500
 
+    def generate():
+        # Predictions go out batch by batch, so memory stays bounded for any upload size
+        yield '\n'.join(str(p) for p in first_preds)
+        current = 'read'
+        try:
+            while True:
+                current = 'read'
+                with timer.span(current):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                current = 'predict'
+                with timer.span(current):
+                    preds = predict_batch(batch)
+                timer.lines += len(batch)
+                yield '\n' + '\n'.join(str(p) for p in preds)
+        except Exception as e:
+            timer.error(current, e)
+            print(f"Text processing error: {e}")
+            # The 200 status is already sent, so the client learns of the failure from the last line
+            yield f'\n{STREAM_ERROR_MARKER} Processing failed after {timer.lines} lines'
+        finally:
+            stream.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=predictions.txt'})
+
 @app.route('/upload-audio', methods=['POST'])
 def handle_audio_upload():
-    """Handle audio file upload and processing"""
+    """Queue an uploaded clip for conversion, transcription and classification"""
+    if request.content_length is not None and request.content_length > AUDIO_MAX_BYTES + 64 * 1024:
+        return jsonify({'error': f'Audio larger than {AUDIO_MAX_BYTES} bytes'}), 413
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file'}), 400
 
@@ -162,29 +690,44 @@ def handle_audio_upload():
     if audio_file.filename == '':
         return jsonify({'error': 'Empty filename'}), 400
 
+    current = 'read'
     try:
-        # Save uploaded audio
-        webm_path = os.path.join(UPLOAD_FOLDER, 'input_audio.webm')
-        audio_file.save(webm_path)
-        
-        # Convert to WAV
-        wav_path = os.path.join(UPLOAD_FOLDER, 'input_audio_converted.wav')
-        if not convert_to_wav(webm_path, wav_path):
-            return jsonify({'error': 'Audio conversion failed'}), 500
-        
-        # Transcribe audio
-        txt_path = os.path.join(UPLOAD_FOLDER, 'asr-text.txt')
-        transcription = transcribe_audio(wav_path, txt_path)
-        
-        return jsonify({
-            'message': 'Audio processed successfully',
-            'transcription': transcription
-        }), 200
-        
+        with g.timer.span(current):
+            data = audio_file.read()
+        if not data:
+            return jsonify({'error': 'Empty audio file'}), 400
+
+        def on_done(job_id):
+            record_audio_job(job_id)
+
+        current = 'submit'
+        with g.timer.span(current):
+            start_audio_stack()
+            if AUDIO_STREAMING:
+                job_id = audio_jobs.submit(streaming_asr.process_audio_stream, audio_executor, data,
+                                           AUDIO_MAX_SECONDS, 2 * AUDIO_WORKERS, on_done=on_done, progress=True)
+            else:
+                job_id = audio_jobs.submit(audio_worker.process_audio_job, data, AUDIO_MAX_SECONDS,
+                                           on_done=on_done)
+    except QueueFull as e:
+        g.timer.error(current, e)
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
     except Exception as e:
+        g.timer.error(current, e)
         return jsonify({'error': str(e)}), 500
 
+    return jsonify({
+        'message': 'Audio queued for processing',
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events',
+    }), 202
+
 if __name__ == '__main__':
     # Create upload directory if it doesn't exist
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # The debug reloader serves from a child process that re-runs this script;
+    # its watching parent must not start anything
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_serving()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached prediction up to a long transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms rendered in Prometheus text format.
+
+    Each metric is declared once with its label names; samples are keyed by
+    label values. Gauges are read from callbacks when the page is rendered.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._gauges = []
+
+    def counter(self, name, help_text, labels=()):
+        self._metrics[name] = {'type': 'counter', 'help': help_text, 'labels': tuple(labels), 'samples': {}}
+
+    def histogram(self, name, help_text, labels=()):
+        self._metrics[name] = {'type': 'histogram', 'help': help_text, 'labels': tuple(labels), 'samples': {}}
+
+    def gauge(self, name, help_text, read):
+        """Register ``read()``, returning a number or a dict of ``((label, value), ...)`` tuples to numbers"""
+        self._gauges.append((name, help_text, read))
+
+    def inc(self, name, amount=1, **labels):
+        metric = self._metrics[name]
+        key = tuple(str(labels.get(label, '')) for label in metric['labels'])
+        with self._lock:
+            metric['samples'][key] = metric['samples'].get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        metric = self._metrics[name]
+        key = tuple(str(labels.get(label, '')) for label in metric['labels'])
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            sample = metric['samples'].get(key)
+            if sample is None:
+                sample = metric['samples'][key] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, sample in sorted(metric['samples'].items()):
+                    labels = list(zip(metric['labels'], key))
+                    if metric['type'] == 'counter':
+                        lines.append(f"{name}{_labels(labels)} {_number(sample)}")
+                        continue
+                    counts, total, count = sample
+                    cumulative = 0
+                    for bound, bucket_count in zip(self._buckets + (float('inf'),), counts):
+                        cumulative += bucket_count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, help_text, read in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            value = read()
+            samples = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, sample in samples:
+                lines.append(f"{name}{_labels(list(labels))} {_number(sample)}")
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """Per-request stage timings, reported to ``Metrics`` when the request finishes"""
+
+    def __init__(self, route):
+        self.route = route
+        self.language = ''
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.errors = []
+        self.lines = 0
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def error(self, stage, exc):
+        self.errors.append((stage, f'{type(exc).__name__}: {exc}'))
+
+    def finish(self, metrics, status, slow_log=None):
+        """Record the request once; later calls are ignored"""
+        if self.started is None:
+            return
+        elapsed = time.perf_counter() - self.started
+        self.started = None
+        metrics.inc('aspect_requests_total', route=self.route, status=status)
+        metrics.observe('aspect_request_duration_seconds', elapsed, route=self.route, language=self.language)
+        for stage, seconds in self.stages.items():
+            metrics.observe('aspect_stage_duration_seconds', seconds,
+                            route=self.route, stage=stage, language=self.language)
+        for stage, _ in self.errors:
+            metrics.inc('aspect_errors_total', route=self.route, stage=stage)
+        if self.lines:
+            metrics.inc('aspect_lines_total', self.lines, route=self.route, language=self.language)
+        if slow_log is not None:
+            slow_log.record(self, status, elapsed)
+
+
+class SlowRequestLog:
+    """Append requests slower than ``threshold`` seconds to ``path`` as JSON lines, or print them"""
+
+    def __init__(self, threshold, path=None):
+        self.threshold = threshold
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, timer, status, elapsed):
+        if elapsed < self.threshold:
+            return
+        entry = json.dumps({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'route': timer.route,
+            'status': status,
+            'language': timer.language,
+            'lines': timer.lines,
+            'seconds': round(elapsed, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in timer.stages.items()},
+            'errors': [f'{stage}: {message}' for stage, message in timer.errors],
+        }, ensure_ascii=False)
+        if self.path is None:
+            print(f"Slow request: {entry}")
+            return
+        with self._lock, open(self.path, 'a', encoding='utf-8') as log:
+            log.write(entry + '\n')
+
+
+def register_service_metrics(metrics):
+    """Declare the request, stage, error and line metrics used by RequestTimer"""
+    metrics.counter('aspect_requests_total', 'Requests handled, by route and HTTP status',
+                    ('route', 'status'))
+    metrics.histogram('aspect_request_duration_seconds', 'Request latency including streamed bodies',
+                      ('route', 'language'))
+    metrics.histogram('aspect_stage_duration_seconds', 'Time spent in each pipeline stage of a request or job',
+                      ('route', 'stage', 'language'))
+    metrics.counter('aspect_errors_total', 'Failures, by route and the stage that raised', ('route', 'stage'))
+    metrics.counter('aspect_lines_total', 'Lines classified', ('route', 'language'))
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
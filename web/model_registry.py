@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ModelRegistry:
+    """Process-wide cache of per-language model bundles.
+
+    Each bundle is registered under a key together with the files it is built
+    from. Bundles are loaded once on first use (or via ``preload``) and shared
+    across requests. The registry keeps at most ``max_bytes`` worth of bundles
+    resident, measured by their on-disk size, and evicts the least recently
+    used ones first. When ``reload_interval`` is set, the files are re-stat'ed
+    at most that often and a bundle is reloaded when any of them, or of the
+    extra files it watches, changed.
+    """
+
+    def __init__(self, loader, max_bytes=None, reload_interval=2.0):
+        self._loader = loader
+        self._max_bytes = max_bytes
+        self._reload_interval = reload_interval
+        self._paths = {}
+        self._watch = {}
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'reloads': 0,
+            'evictions': 0,
+            'load_seconds': 0.0,
+        }
+
+    def register(self, key, paths, watch=()):
+        """Declare the files that make up the bundle stored under ``key``.
+
+        A change to a ``watch`` file also reloads the bundle, but only
+        ``paths`` are passed to the loader and counted towards its size.
+        """
+        with self._lock:
+            self._paths[key] = tuple(paths)
+            self._watch[key] = tuple(watch)
+            self._key_locks.setdefault(key, threading.Lock())
+            self._entries.pop(key, None)
+
+    def keys(self):
+        return list(self._paths)
+
+    def get(self, key):
+        """Return the bundle for ``key``, loading or reloading it if needed"""
+        if key not in self._paths:
+            raise KeyError(f"Unknown model bundle: {key}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._is_stale(key, entry):
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry['bundle']
+
+        # Load outside the registry lock so other bundles stay available,
+        # but serialise loads of the same key.
+        with self._key_locks[key]:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not self._is_stale(key, entry):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry['bundle']
+                reloading = entry is not None
+                self._stats['misses'] += 1
+
+            paths = self._paths[key]
+            signature = self._signature(key)
+            start = time.perf_counter()
+            bundle = self._loader(paths)
+            elapsed = time.perf_counter() - start
+
+            self._store(key, bundle, signature, elapsed, reloading)
+            return bundle
+
+    def swap(self, path):
+        """Load fresh bundles for every key built from ``path`` and swap them in.
+
+        Requests keep getting the old bundle until the new one is loaded, so
+        a replaced model file goes live without a cold load on any request.
+        """
+        with self._lock:
+            keys = [key for key, paths in self._paths.items() if path in paths]
+        for key in keys:
+            with self._key_locks[key]:
+                paths = self._paths[key]
+                signature = self._signature(key)
+                start = time.perf_counter()
+                bundle = self._loader(paths)
+                self._store(key, bundle, signature, time.perf_counter() - start, reloading=True)
+        return keys
+
+    def preload(self, keys=None):
+        """Load the given bundles (all registered ones by default) up front"""
+        for key in keys if keys is not None else self.keys():
+            self.get(key)
+
+    def invalidate(self, key=None):
+        """Drop one bundle, or every bundle, so it is reloaded on next use"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Return a snapshot of the hit/miss/load counters and residency"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            snapshot = dict(self._stats)
+            snapshot['hit_ratio'] = self._stats['hits'] / lookups if lookups else 0.0
+            snapshot['resident'] = list(self._entries)
+            snapshot['resident_bytes'] = sum(e['size'] for e in self._entries.values())
+            snapshot['max_bytes'] = self._max_bytes
+            return snapshot
+
+    def _store(self, key, bundle, signature, elapsed, reloading):
+        with self._lock:
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += elapsed
+            if reloading:
+                self._stats['reloads'] += 1
+            self._entries[key] = {
+                'bundle': bundle,
+                'signature': signature,
+                'size': sum(size for _, size in signature[:len(self._paths[key])]),
+                'checked_at': time.monotonic(),
+                'stale': False,
+            }
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def _signature(self, key):
+        signature = []
+        for path in self._paths[key] + self._watch[key]:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _is_stale(self, key, entry):
+        if self._reload_interval is None or entry['stale']:
+            return entry['stale']
+        now = time.monotonic()
+        if now - entry['checked_at'] < self._reload_interval:
+            return False
+        entry['checked_at'] = now
+        try:
+            entry['stale'] = self._signature(key) != entry['signature']
+        except OSError:
+            # A file being replaced mid-write; keep serving the old bundle.
+            pass
+        return entry['stale']
+
+    def _evict(self, keep):
+        if self._max_bytes is None:
+            return
+        resident = sum(e['size'] for e in self._entries.values())
+        for key in list(self._entries):
+            if resident <= self._max_bytes:
+                break
+            if key == keep:
+                continue
+            resident -= self._entries.pop(key)['size']
+            self._stats['evictions'] += 1
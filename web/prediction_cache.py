@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Cache of per-line predictions keyed by (model content hash, normalized line).
+
+    Lookups go through an in-memory LRU of ``max_entries`` lines and, when
+    ``db_path`` is given, a SQLite table that survives restarts and is shared
+    by every worker using the same file. Keys include the hash of the model
+    file, so a retrained model never sees predictions made by its predecessor;
+    ``track_source`` additionally drops the old model's rows from disk.
+    """
+
+    def __init__(self, max_entries=100000, db_path=None):
+        self._max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS predictions ('
+                             'model TEXT NOT NULL, line BLOB NOT NULL, label TEXT NOT NULL, '
+                             'PRIMARY KEY (model, line)) WITHOUT ROWID')
+            self._db.execute('CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, model TEXT NOT NULL)')
+        self._stats = {'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'deduplicated': 0}
+
+    def predict(self, model, lines):
+        """Predict ``lines`` with ``model``, computing each distinct uncached line once"""
+        if model.source_hash is None:
+            return list(model.predict(lines))
+        keys = [model.normalize(line) for line in lines]
+        unique = list(dict.fromkeys(keys))
+        labels = self._get_memory(model.source_hash, unique)
+
+        missing = [key for key in unique if key not in labels]
+        if missing and self._db is not None:
+            found = self._get_disk(model.source_hash, missing)
+            self._put_memory(model.source_hash, found)
+            labels.update(found)
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            computed = {key: str(label) for key, label in zip(missing, model.predict(missing))}
+            self._put_memory(model.source_hash, computed)
+            if self._db is not None:
+                self._put_disk(model.source_hash, computed)
+            labels.update(computed)
+
+        with self._lock:
+            self._stats['lookups'] += len(keys)
+            self._stats['deduplicated'] += len(keys) - len(unique)
+            self._stats['misses'] += len(missing)
+        return [labels[key] for key in keys]
+
+    def track_source(self, path, model):
+        """Record that ``path`` now holds ``model`` and forget predictions of the model it replaced"""
+        if self._db is None or model.source_hash is None:
+            return
+        path = os.path.abspath(path)
+        with self._db_lock:
+            row = self._db.execute('SELECT model FROM sources WHERE path = ?', (path,)).fetchone()
+            if row is not None and row[0] == model.source_hash:
+                return
+            self._db.execute('BEGIN')
+            if row is not None:
+                self._db.execute('DELETE FROM predictions WHERE model = ?', (row[0],))
+            self._db.execute('INSERT OR REPLACE INTO sources (path, model) VALUES (?, ?)',
+                             (path, model.source_hash))
+            self._db.execute('COMMIT')
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """Lookup counters and the fraction of lines served without predicting"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['memory_entries'] = len(self._memory)
+            snapshot['max_entries'] = self._max_entries
+        snapshot['disk'] = self._db is not None
+        lookups = snapshot['lookups']
+        snapshot['hit_ratio'] = (lookups - snapshot['misses']) / lookups if lookups else 0.0
+        return snapshot
+
+    def _get_memory(self, model_hash, keys):
+        found = {}
+        hits = 0
+        with self._lock:
+            for key in keys:
+                label = self._memory.get((model_hash, key))
+                if label is not None:
+                    self._memory.move_to_end((model_hash, key))
+                    found[key] = label
+                    hits += 1
+            self._stats['memory_hits'] += hits
+        return found
+
+    def _put_memory(self, model_hash, labels):
+        if not self._max_entries:
+            return
+        with self._lock:
+            for key, label in labels.items():
+                self._memory[(model_hash, key)] = label
+                self._memory.move_to_end((model_hash, key))
+            while len(self._memory) > self._max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, model_hash, keys):
+        digests = {_digest(key): key for key in keys}
+        found = {}
+        items = list(digests)
+        with self._db_lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                rows = self._db.execute(
+                    f'SELECT line, label FROM predictions WHERE model = ? AND line IN ({",".join("?" * len(chunk))})',
+                    [model_hash, *chunk]).fetchall()
+                for digest, label in rows:
+                    found[digests[digest]] = label
+        with self._lock:
+            self._stats['disk_hits'] += len(found)
+        return found
+
+    def _put_disk(self, model_hash, labels):
+        with self._db_lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR REPLACE INTO predictions (model, line, label) VALUES (?, ?, ?)',
+                                 [(model_hash, _digest(key), label) for key, label in labels.items()])
+            self._db.execute('COMMIT')
+
+
+def _digest(line):
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
@@ -76,6 +76,9 @@ uploadBtn.addEventListener("click", async () => {
         if (!response.ok) throw new Error("Upload failed");
 
         const text = await response.text();
+        // A failure after the first batch ends the streamed response with an #ERROR line
+        const errorLine = text.split("\n").find(line => line.startsWith("#ERROR"));
+        if (errorLine) throw new Error(errorLine);
         updateChart(text);
         status.textContent = "✅ File processed successfully!";
     } catch (error) {
@@ -123,6 +126,22 @@ async function toggleRecording() {
     }
 }
 
+// Poll an audio job until it has finished
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) throw new Error("Job lookup failed");
+        const job = await response.json();
+        if (job.status === "done") return job;
+        if (job.status === "failed") throw new Error(job.error || "Audio processing failed");
+        // Streaming jobs report each transcribed segment as it finishes
+        if (job.partials && job.partials.length) {
+            status.textContent = `💬 Transcribing audio... ${job.partials.map(p => p.text).join(" ")}`;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Handle audio upload, conversion, transcription and classification
 async function handleAudioUpload(blob) {
     status.textContent = "🔊 Processing audio...";
@@ -137,14 +156,23 @@ async function handleAudioUpload(blob) {
             body: formData
         });
 
+        if (uploadResponse.status === 429) {
+            throw new Error("Server busy, try again shortly");
+        }
         if (!uploadResponse.ok) {
             throw new Error("Audio upload failed");
         }
+        const { job_id: jobId } = await uploadResponse.json();
 
-        // Step 2: Process ASR (this now includes conversion and transcription)
+        // Step 2: Wait for the background job to convert and transcribe the audio
         status.textContent = "💬 Transcribing audio...";
+        await waitForJob(jobId);
+
+        const asrForm = new FormData();
+        asrForm.append("job_id", jobId);
         const asrResponse = await fetch("/upload-asr", {
-            method: "POST"
+            method: "POST",
+            body: asrForm
         });
 
         if (!asrResponse.ok) {
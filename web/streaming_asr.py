@@ -0,0 +1,69 @@
+import time
+from collections import deque
+
+import audio_worker
+from vad import EnergyVAD
+
+
+def transcribe_stream(executor, chunks, report, max_in_flight=2, vad=None):
+    """Segment decoded audio on pauses and transcribe the segments on ``executor``.
+
+    ``chunks`` yields 16 kHz float32 sample arrays as they are decoded. Each
+    speech segment goes to ``audio_worker.process_segment`` as soon as the
+    VAD closes it, and finished segments are passed to ``report`` in order,
+    so the first result arrives after the first pause however long the clip
+    is. At most ``max_in_flight`` segments are queued, which also bounds how
+    far decoding runs ahead.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    vad = vad or EnergyVAD(audio_worker.SAMPLE_RATE)
+    in_flight = deque()
+    segments = []
+    timings = {'convert': 0.0, 'transcribe': 0.0, 'predict': 0.0}
+
+    def collect(block):
+        while in_flight and (block or in_flight[0].done()):
+            segment = in_flight.popleft().result()
+            segment['index'] = len(segments)
+            segments.append(segment)
+            for stage, seconds in segment['timings'].items():
+                timings[stage] += seconds
+            if len(segments) == 1:
+                timings['first_result'] = time.perf_counter() - start
+            report(segment)
+            block = block and len(in_flight) >= max_in_flight
+
+    def submit(found):
+        for start_sample, samples in found:
+            in_flight.append(executor.submit(audio_worker.process_segment, samples, start_sample))
+            collect(block=len(in_flight) >= max_in_flight)
+
+    chunks = iter(chunks)
+    while True:
+        decode_start = time.perf_counter()
+        chunk = next(chunks, None)
+        timings['convert'] += time.perf_counter() - decode_start
+        if chunk is None:
+            break
+        submit(vad.feed(chunk))
+        collect(block=False)
+    submit(vad.flush())
+    while in_flight:
+        collect(block=True)
+
+    lines = [line for segment in segments for line in segment['lines']]
+    return {
+        'transcription': ' '.join(segment['text'] for segment in segments if segment['text']),
+        'lines': lines,
+        'predictions': [p for segment in segments for p in segment['predictions']],
+        'segments': [{k: segment[k] for k in ('index', 'start', 'end', 'text')} for segment in segments],
+        'timings': timings,
+        'started_at': started_at,
+    }
+
+
+def process_audio_stream(executor, data, max_seconds=None, max_in_flight=2, report=None):
+    """Streaming counterpart of audio_worker.process_audio_job for one uploaded clip"""
+    chunks = audio_worker.iter_pcm_chunks(data, max_seconds=max_seconds)
+    return transcribe_stream(executor, chunks, report, max_in_flight)
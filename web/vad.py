@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class EnergyVAD:
+    """Split a stream of mono float32 samples into speech segments at pauses.
+
+    Each ``frame_ms`` frame is speech when its energy is ``threshold_db``
+    above a running noise floor and within ``peak_drop_db`` of a slowly
+    decaying peak, so steady background noise is not taken for speech. A
+    segment ends after ``min_silence_ms`` of non-speech or at
+    ``max_segment_s``, and is padded by ``pad_ms`` on both sides. Only
+    the open segment is buffered, so memory does not grow with the
+    length of the stream.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, threshold_db=12.0, min_silence_ms=400,
+                 min_speech_ms=200, max_segment_s=30.0, pad_ms=150, floor_db=-55.0, peak_drop_db=20.0):
+        self.sample_rate = sample_rate
+        self._frame = int(sample_rate * frame_ms / 1000)
+        self._threshold = threshold_db
+        self._min_silence = max(1, int(min_silence_ms / frame_ms))
+        self._min_speech = max(1, int(min_speech_ms / frame_ms))
+        self._max_segment = int(max_segment_s * sample_rate)
+        self._pad = int(sample_rate * pad_ms / 1000)
+        self._floor = floor_db
+        self._min_db = floor_db
+        self._peak = None
+        self._peak_drop = peak_drop_db
+        # Peak decay per frame: 2 dB per second
+        self._peak_decay = 2.0 * frame_ms / 1000
+        self._buffer = np.empty(0, dtype=np.float32)
+        self._buffer_start = 0
+        self._pos = 0
+        self._segment_start = None
+        self._speech_frames = 0
+        self._silent_frames = 0
+
+    def feed(self, samples):
+        """Add samples; return the ``(start_sample, audio)`` segments completed by them"""
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float32)])
+        segments = []
+        end_of_buffer = self._buffer_start + len(self._buffer)
+        while self._pos + self._frame <= end_of_buffer:
+            offset = self._pos - self._buffer_start
+            frame = self._buffer[offset:offset + self._frame]
+            db = 10 * np.log10(float(np.dot(frame, frame)) / len(frame) + 1e-10)
+            self._peak = db if self._peak is None else max(db, self._peak - self._peak_decay)
+            speech = db > max(self._floor + self._threshold, self._min_db, self._peak - self._peak_drop)
+            if db < self._floor:
+                self._floor = db
+            elif not speech:
+                self._floor += 0.05 * (db - self._floor)
+            frame_end = self._pos + self._frame
+
+            if self._segment_start is None:
+                if speech:
+                    self._segment_start = max(self._pos - self._pad, self._buffer_start)
+                    self._speech_frames, self._silent_frames = 1, 0
+            else:
+                if speech:
+                    self._speech_frames += 1
+                    self._silent_frames = 0
+                else:
+                    self._silent_frames += 1
+                if self._silent_frames >= self._min_silence:
+                    cut = frame_end - self._silent_frames * self._frame + self._pad
+                    segments.extend(self._close(min(cut, frame_end)))
+                elif frame_end - self._segment_start >= self._max_segment:
+                    segments.extend(self._close(frame_end))
+            self._pos = frame_end
+
+        # Keep the open segment, or just enough audio to pad the next one
+        keep_from = self._segment_start if self._segment_start is not None else self._pos - self._pad
+        keep_from = max(keep_from, self._buffer_start)
+        self._buffer = self._buffer[keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+        return segments
+
+    def flush(self):
+        """Close the open segment at the end of the stream"""
+        end = self._buffer_start + len(self._buffer)
+        return self._close(end) if self._segment_start is not None else []
+
+    def _close(self, end):
+        start = self._segment_start
+        self._segment_start = None
+        if self._speech_frames < self._min_speech:
+            return []
+        audio = self._buffer[start - self._buffer_start:end - self._buffer_start].copy()
+        return [(start, audio)]